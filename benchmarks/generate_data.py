@@ -0,0 +1,111 @@
+"""
+Generator of synthetic input tables in the schema of csv_reader, for benchmarks and testing.
+
+    python benchmarks/generate_data.py output.csv --rows 100000 [--surname-skew 1.0] [--initial-rate 0.1]
+        [--middle-rate 0.6] [--middle-initial-rate 0.4] [--board-size 8] [--multi-board-rate 0.3]
+        [--duplicate-rate 0.01] [--seed 0]
+
+Each row is a person sitting on the board of a firm. Surnames follow a Zipf distribution with exponent
+--surname-skew, so larger values give larger blocks of entries sharing a surname. People are drawn anew,
+or with probability --multi-board-rate from those already drawn, so the same person sits on several boards,
+and each row renders the name of its person with First and Middle Names reduced to initials at the given
+rates. Firms have --board-size rows on average, and with probability --duplicate-rate a row is repeated on
+the same board, under a possibly different rendering of the name.
+"""
+import argparse
+import bisect
+import csv
+import itertools
+import random
+
+FIRSTS = ["John", "James", "William", "George", "Charles", "Frank", "Joseph", "Henry", "Robert", "Thomas",
+          "Edward", "Harry", "Walter", "Arthur", "Fred", "Albert", "Samuel", "Clarence", "Louis", "David",
+          "Charlie", "Richard", "Ernest", "Roy", "Will", "Andrew", "Jesse", "Oscar", "Willie", "Daniel"]
+SUFFIXES = ["Jr", "Sr", "II", "III"]
+SUFFIX_RATE = 0.05
+
+
+def get_surnames(num_surnames, skew):
+    """Return surnames and the cumulative Zipf weights with which they are drawn."""
+    surnames = ["Surname{}".format(i) for i in range(num_surnames)]
+    cum_weights = list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, num_surnames + 1)))
+    return surnames, cum_weights
+
+
+def render_name(rng, person, initial_rate, middle_initial_rate):
+    first, middle, last, suffix = person
+    if rng.random() < initial_rate:
+        first = first[0]
+    if middle != "0" and rng.random() < middle_initial_rate:
+        middle = middle[0]
+    return first, middle, last, suffix
+
+
+def generate_rows(rows, surname_skew=1.0, initial_rate=0.1, middle_rate=0.6, middle_initial_rate=0.4,
+                  board_size=8, multi_board_rate=0.3, duplicate_rate=0.01, seed=0):
+    """Yield rows (firm_name, first, middle, last, suffix, firm_id, full_name, address) in the default column
+    order of csv_reader."""
+    rng = random.Random(seed)
+    surnames, cum_weights = get_surnames(max(10, rows // 10), surname_skew)
+    total_weight = cum_weights[-1]
+    num_firms = max(1, round(rows / board_size))
+    people = []
+    previous = None
+    for _ in range(rows):
+        if previous is not None and rng.random() < duplicate_rate:
+            person, firm = previous
+        else:
+            if people and rng.random() < multi_board_rate:
+                person = rng.choice(people)
+            else:
+                last = surnames[bisect.bisect(cum_weights, rng.random() * total_weight)]
+                middle = rng.choice(FIRSTS) if rng.random() < middle_rate else "0"
+                suffix = rng.choice(SUFFIXES) if rng.random() < SUFFIX_RATE else "0"
+                person = (rng.choice(FIRSTS), middle, last, suffix)
+                people.append(person)
+            firm = rng.randrange(num_firms)
+        previous = person, firm
+        first, middle, last, suffix = render_name(rng, person, initial_rate, middle_initial_rate)
+        full_name = " ".join(x for x in [first, middle, last, suffix] if x != "0")
+        address = "{} Main St".format(rng.randrange(1000))
+        yield ["Firm {}".format(firm), first, middle, last, suffix, "F{}".format(firm), full_name, address]
+
+
+def write_data(path, rows, **parameters):
+    with open(path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["firm_name", "first", "middle", "last", "suffix", "firm_id", "full_name", "address"])
+        writer.writerows(generate_rows(rows, **parameters))
+
+
+def add_generator_arguments(parser):
+    parser.add_argument('--surname-skew', type=float, default=1.0, help='Zipf exponent of surname frequencies')
+    parser.add_argument('--initial-rate', type=float, default=0.1, help='rate of first names given as initials')
+    parser.add_argument('--middle-rate', type=float, default=0.6, help='rate of people with a middle name')
+    parser.add_argument('--middle-initial-rate', type=float, default=0.4,
+                        help='rate of middle names given as initials')
+    parser.add_argument('--board-size', type=float, default=8, help='average number of rows per firm')
+    parser.add_argument('--multi-board-rate', type=float, default=0.3,
+                        help='rate of rows of a person already drawn')
+    parser.add_argument('--duplicate-rate', type=float, default=0.01,
+                        help='rate of rows repeating the person and firm of the previous row')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def get_generator_parameters(args):
+    return {"surname_skew": args.surname_skew, "initial_rate": args.initial_rate, "middle_rate": args.middle_rate,
+            "middle_initial_rate": args.middle_initial_rate, "board_size": args.board_size,
+            "multi_board_rate": args.multi_board_rate, "duplicate_rate": args.duplicate_rate, "seed": args.seed}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output', help='path of the csv to write')
+    parser.add_argument('--rows', type=int, default=100000)
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    write_data(args.output, args.rows, **get_generator_parameters(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark of the transitivity check and equivalence class construction on a single large block
+of entries sharing a First Initial, Middle Initial, Last Name and Suffix, e.g. (J, A, Smith, "").
+
+    python benchmarks/mega_block.py [--sizes 100 1000 4000] [--pairwise-limit 200]
+
+The all-pairs relation set implementation that get_equivalence_classes replaced is timed as well,
+for sizes up to --pairwise-limit, as its transitivity check is quadratic in the size of the relation.
+"""
+import argparse
+import random
+import time
+from directorship.classes.entry_table import EntryTable
+from directorship.entry_handler import get_equivalence_classes, \
+    compare_entries_with_first_and_middle_init_and_same_last_and_suffix
+
+FIRSTS = ["John", "James", "Joseph", "Jacob", "Jack", "Jesse"]
+MIDDLES = ["Adam", "Albert", "Arthur", "Alfred", "Allen", "Amos"]
+
+
+def get_mega_block(size, initial_rate, seed=0):
+    """Return size entries in the block (J, A, Smith, ""), with a fraction initial_rate of initialed names."""
+    rng = random.Random(seed)
+    table = EntryTable()
+    for i in range(size):
+        first = "J" if rng.random() < initial_rate else rng.choice(FIRSTS)
+        middle = "A" if rng.random() < initial_rate else rng.choice(MIDDLES)
+        table.append("F{}".format(i), "", "{} {} Smith".format(first, middle), first, middle, "Smith", "0", "")
+    return list(table)
+
+
+def get_pairwise_equivalence_classes(entries):
+    """The all-pairs relation set construction, transitivity check and class construction that
+    get_equivalence_classes replaced, returning None if the relation is not transitive."""
+    relation_set = set()
+    for e1 in entries:
+        for e2 in entries:
+            if compare_entries_with_first_and_middle_init_and_same_last_and_suffix(e1, e2):
+                relation_set.add((e1, e2))
+    for e1, e2 in relation_set:
+        for e3, e4 in relation_set:
+            if e2 == e3:
+                if (e1, e4) not in relation_set:
+                    return None
+    classes = {}
+    for e1, e2 in relation_set:
+        placed = False
+        for representative in classes:
+            if (e1, representative) in relation_set:
+                placed = True
+                classes[representative].add(e1)
+                classes[representative].add(e2)
+        if not placed:
+            classes[e1] = {e1, e2}
+    return list(classes.values())
+
+
+def time_call(f, entries):
+    start_time = time.perf_counter()
+    result = f(entries)
+    return time.perf_counter() - start_time, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 100, 200, 1000, 2000, 4000])
+    parser.add_argument('--pairwise-limit', type=int, default=200)
+    args = parser.parse_args()
+
+    print("{:>8} {:>10} {:>14} {:>14} {:>10}".format("size", "initials", "union-find", "pairwise", "classes"))
+    for initial_rate in (0.0, 0.1):
+        for size in args.sizes:
+            entries = get_mega_block(size, initial_rate)
+            seconds, classes = time_call(get_equivalence_classes, entries)
+            pairwise = "-"
+            if size <= args.pairwise_limit:
+                pairwise_seconds, pairwise_classes = time_call(get_pairwise_equivalence_classes, entries)
+                assert (classes is None) == (pairwise_classes is None)
+                pairwise = "{:.4f}s".format(pairwise_seconds)
+            print("{:>8} {:>10} {:>13.4f}s {:>14} {:>10}".format(
+                size, initial_rate, seconds, pairwise, "intrans." if classes is None else len(classes)))
+
+
+if __name__ == "__main__":
+    main()
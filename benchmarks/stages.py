@@ -0,0 +1,115 @@
+"""
+Benchmark of the stages of a run on synthetic inputs of increasing size, written as JSON.
+
+    PYTHONPATH=. python benchmarks/stages.py [--sizes 10000 100000 1000000] [--repeat 3] [--output results.json]
+        [--data-dir DIR] [generator options of generate_data.py]
+
+For each size, an input is generated by generate_data.py (kept in --data-dir if given, and reused by later
+runs with the same parameters), and the best of --repeat timings of each stage is recorded:
+
+    read_csv          parsing the input into an EntryTable
+    get_directors     resolving directors, with logging disabled
+    graph_firms       building the Projection of the firm graph
+    graph_directors   building the Projection of the director graph
+    write_firms       write_graph_to_csv of the firm graph
+    write_directors   write_graph_to_csv of the director graph
+
+The JSON holds the environment, the generator parameters, and one result per size and stage, so that runs
+can be compared, e.g. before and after a change, and plotted against the number of rows.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from generate_data import write_data, add_generator_arguments, get_generator_parameters
+from directorship.classes.director import Director
+from directorship.classes.graph import Graph
+from directorship.csv_reader import read_csv
+from directorship.csv_writer import write_graph_to_csv
+from directorship.entry_handler import get_directors
+from directorship.log_writer import LogWriter, LOG_LEVEL_NONE
+
+
+def get_environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "commit": commit}
+
+
+def time_stages(input_path, work_directory):
+    """Run each stage once on input_path, and return the seconds taken by each."""
+    seconds = {}
+
+    start_time = time.perf_counter()
+    table, firm_map = read_csv(input_path)
+    seconds["read_csv"] = time.perf_counter() - start_time
+
+    log_writer = LogWriter(work_directory + "/", LOG_LEVEL_NONE)
+    Director.set_log_writer(log_writer)
+    start_time = time.perf_counter()
+    directors = get_directors(iter(table), firm_map, log_writer)
+    seconds["get_directors"] = time.perf_counter() - start_time
+
+    graphs = {"firms": Graph(list(firm_map.values())), "directors": Graph(directors)}
+    for name, graph in graphs.items():
+        start_time = time.perf_counter()
+        graph.get_projection()
+        seconds["graph_" + name] = time.perf_counter() - start_time
+
+    for name, graph in graphs.items():
+        start_time = time.perf_counter()
+        # write_graph_to_csv reports its progress, which is not part of the benchmark
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_graph_to_csv(os.path.join(work_directory, name + "_edge_list.csv"), graph)
+        seconds["write_" + name] = time.perf_counter() - start_time
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3, help='number of timings of each stage, of which the '
+                                                              'best is kept')
+    parser.add_argument('--output', type=str, default=None, help='path of the JSON results, default stdout')
+    parser.add_argument('--data-dir', type=str, default=None, help='directory keeping the generated inputs')
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    parameters = get_generator_parameters(args)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_directory:
+        data_directory = args.data_dir or work_directory
+        os.makedirs(data_directory, exist_ok=True)
+        for size in args.sizes:
+            name = "rows{}_".format(size) + "_".join("{}{}".format(k, v) for k, v in parameters.items())
+            input_path = os.path.join(data_directory, name + ".csv")
+            if not os.path.isfile(input_path):
+                write_data(input_path, size, **parameters)
+            timings = [time_stages(input_path, work_directory) for _ in range(args.repeat)]
+            for stage in timings[0]:
+                stage_seconds = [t[stage] for t in timings]
+                results.append({"rows": size, "stage": stage, "best": min(stage_seconds), "seconds": stage_seconds})
+                print("{:>9} rows {:>16} {:9.3f}s".format(size, stage, min(stage_seconds)), file=sys.stderr)
+
+    report = {"environment": get_environment(), "parameters": parameters, "repeat": args.repeat,
+              "results": results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
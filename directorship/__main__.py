@@ -1,7 +1,20 @@
 import sys
 
 def main():
-    from directorship.directorship import parse_args, main
+    from directorship.directorship import parse_args, main, parse_logs_args, logs_main, parse_batch_args, \
+        batch_main, parse_link_years_args, link_years_main, parse_analyze_args, analyze_main
+    if sys.argv[1:2] == ['logs']:
+        logs_main(parse_logs_args(sys.argv[2:]))
+        return
+    if sys.argv[1:2] == ['batch']:
+        batch_main(parse_batch_args(sys.argv[2:]))
+        return
+    if sys.argv[1:2] == ['link-years']:
+        link_years_main(parse_link_years_args(sys.argv[2:]))
+        return
+    if sys.argv[1:2] == ['analyze']:
+        analyze_main(parse_analyze_args(sys.argv[2:]))
+        return
     args = parse_args(sys.argv[1:])
     main(args)
 
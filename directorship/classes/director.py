@@ -1,10 +1,19 @@
+from array import array
+from bisect import bisect_left
+
 
 class Director:
 
+    __slots__ = ("index", "first", "is_first_init", "middle", "is_middle_init", "last", "suffix",
+                 "firms", "entries", "flagged_for_duplicate_entry", "reference", "aliases", "info")
+
     log_writer = None
 
     def __init__(self, first, middle, last, suffix, entry):
 
+        # Dense integer index, assigned once the final list of directors is known
+        self.index = None
+
         self.first = first
         self.is_first_init = len(first) == 1
         self.middle = middle
@@ -12,11 +21,17 @@ class Director:
         self.last = last
         self.suffix = suffix
 
-        self.firms = set()
+        # Sorted indices of the firms of the director
+        self.firms = array('I')
         self.entries = [entry]
 
         self.flagged_for_duplicate_entry = False
 
+        # Values derived from the entries, computed on first use and cleared when an entry is associated
+        self.reference = None
+        self.aliases = None
+        self.info = None
+
     def __repr__(self):
         return "Director<{}>".format(str(self))
 
@@ -30,6 +45,14 @@ class Director:
             full_name += " " + self.suffix
         return full_name
 
+    @property
+    def first_init(self):
+        return self.first[0]
+
+    @property
+    def middle_init(self):
+        return self.middle[:1]
+
     def associate_with_entry(self, e):
         if len(e.first) > len(self.first):
             self.first = e.first
@@ -38,48 +61,58 @@ class Director:
             self.middle = e.middle
             self.is_middle_init = len(self.middle) == 1
         self.entries.append(e)
+        self.reference = None
+        self.aliases = None
+        self.info = None
 
     def add_firm(self, firm):
-        if firm not in self.firms:
-            self.firms.add(firm)
+        k = bisect_left(self.firms, firm.index)
+        if k == len(self.firms) or self.firms[k] != firm.index:
+            self.firms.insert(k, firm.index)
         else:
             if not self.flagged_for_duplicate_entry:
                 self.log_writer.write_directors_to_file(self.log_writer.LIST_DUPLICATE_FIRM_ADDED, [self])
                 self.flagged_for_duplicate_entry = True
 
+    def get_links(self):
+        return self.firms
+
     def get_num_links(self, other_director):
-        return len(self.firms.intersection(other_director.firms))
+        return len(set(self.firms).intersection(other_director.firms))
 
     def get_adj_matrix_ref(self):
-        aliases = [e.full_name for e in self.entries]
-        max_length = max([len(a) for a in aliases])
-        return [a for a in aliases if len(a) == max_length][0]
+        if self.reference is None:
+            # The first of the longest full names of the entries
+            self.reference = max((e.full_name for e in self.entries), key=len)
+        return self.reference
 
     def get_aliases(self):
-        return {e.full_name for e in self.entries}
+        if self.aliases is None:
+            self.aliases = frozenset(e.full_name for e in self.entries)
+        return self.aliases
 
     def get_info(self):
-        return "{}" \
-               "\n\taliases: {}" \
-               "\n\tentries: {}" \
-               "\n\taddresses: {}" \
-               "\n\n".format(str(self),
-                             ", ".join({e.full_name for e in self.entries}),
-                             ", ".join([str(e) for e in self.entries]),
-                             ", ".join({e.address for e in self.entries})
-                             )
+        if self.info is None:
+            self.info = "{}" \
+                        "\n\taliases: {}" \
+                        "\n\tentries: {}" \
+                        "\n\taddresses: {}" \
+                        "\n\n".format(str(self),
+                                      ", ".join(self.get_aliases()),
+                                      ", ".join([str(e) for e in self.entries]),
+                                      ", ".join({e.address for e in self.entries})
+                                      )
+        return self.info
 
     def merge(self, other_director):
         assert self.middle, "Director does not have a middle name and is trying to merge"
         assert not other_director.middle, "Director to be merged has a middle name"
-        if len(self.firms.intersection(other_director.firms)) == 0:
+        if self.get_num_links(other_director) == 0:
             self.log_writer.write_merged_directors(self, other_director)
             for e in other_director.entries:
                 self.associate_with_entry(e)
-            while len(other_director.firms) > 0:
-                f = other_director.firms.pop()
-                f.directors.remove(other_director)
-                self.add_firm(f)
+            self.firms = array('I', sorted(self.firms + other_director.firms))
+            other_director.firms = array('I')
             self.log_writer.write_result_from_merge(self)
             return True
         else:
@@ -87,9 +120,23 @@ class Director:
             return False
 
     def remove_from_firms(self):
-        while len(self.firms) > 0:
-            f = self.firms.pop()
-            f.directors.remove(self)
+        # Firms only record their directors once resolution is complete, so only the director is updated
+        self.firms = array('I')
+
+    def get_record(self):
+        """Return the names, entry indices and duplicate flag of the director as plain data."""
+        return (self.first, self.middle, self.last, self.suffix, [e.index for e in self.entries],
+                self.flagged_for_duplicate_entry)
+
+    @staticmethod
+    def from_record(record, table):
+        """Reconstruct a director from its record and the EntryTable holding its entries."""
+        first, middle, last, suffix, entry_indices, flagged = record
+        director = Director(first, middle, last, suffix, table[entry_indices[0]])
+        director.entries = [table[i] for i in entry_indices]
+        director.firms = array('I', sorted({e.firm_index for e in director.entries}))
+        director.flagged_for_duplicate_entry = flagged
+        return director
 
     @staticmethod
     def set_log_writer(log_writer):
@@ -1,35 +1,28 @@
+# Bit flags packed into one byte per row of an EntryTable
+FIRST_INIT = 1
+MIDDLE_INIT = 2
+MIDDLE_VOID = 4
+SUFFIX_VOID = 8
+
 
 class Entry:
     """
     An Entry constructed from a .csv table.
+
+    An Entry is a lightweight view of row index of an EntryTable, which holds the values of the row.
     """
 
-    def __init__(self, firm_id, firm_name, full_name, first, middle, last, suffix, address):
-
-        self.firm_id = firm_id
-        self.firm_name = firm_name
-        self.address = address
-        # Name Info
-        self.full_name = full_name
-        self.first = first
-        self.first_init = first[0]
-        if middle == "0":
-            self.middle = ""
-            self.middle_init = ""
-            self.middle_void = True
-        else:
-            self.middle = middle
-            self.middle_init = middle[0]
-            self.middle_void = False
-        self.last = last
-        if suffix == "0":
-            self.suffix = ""
-            self.suffix_void = True
-        else:
-            self.suffix = suffix
-            self.suffix_void = False
-        self.is_first_init = len(self.first) == 1
-        self.is_middle_init = len(self.middle) == 1
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, Entry) and self.index == other.index and self.table is other.table
+
+    def __hash__(self):
+        return hash(self.index)
 
     def __repr__(self):
         return "Entry<{} {}>".format(self.firm_id, self.full_name)
@@ -37,7 +30,75 @@ class Entry:
     def __str__(self):
         return "<{} | {}>".format(self.firm_id, self.full_name)
 
-    def get_director_constructor(self):
-        return [self.first, self.middle, self.last, self.suffix, self]
+    @property
+    def firm_index(self):
+        return self.table.firms[self.index]
+
+    @property
+    def firm_id(self):
+        return self.table.firm_ids[self.table.firms[self.index]]
+
+    @property
+    def firm_name(self):
+        return self.table.firm_names[self.table.firms[self.index]]
+
+    @property
+    def address(self):
+        column = self.table.address
+        return column.values[column.codes[self.index]]
+
+    # Name Info
+
+    @property
+    def full_name(self):
+        column = self.table.full_name
+        return column.values[column.codes[self.index]]
 
+    @property
+    def first(self):
+        column = self.table.first
+        return column.values[column.codes[self.index]]
 
+    @property
+    def first_init(self):
+        column = self.table.first_init
+        return column.values[column.codes[self.index]]
+
+    @property
+    def middle(self):
+        column = self.table.middle
+        return column.values[column.codes[self.index]]
+
+    @property
+    def middle_init(self):
+        column = self.table.middle_init
+        return column.values[column.codes[self.index]]
+
+    @property
+    def middle_void(self):
+        return bool(self.table.flags[self.index] & MIDDLE_VOID)
+
+    @property
+    def last(self):
+        column = self.table.last
+        return column.values[column.codes[self.index]]
+
+    @property
+    def suffix(self):
+        column = self.table.suffix
+        return column.values[column.codes[self.index]]
+
+    @property
+    def suffix_void(self):
+        return bool(self.table.flags[self.index] & SUFFIX_VOID)
+
+    @property
+    def is_first_init(self):
+        return bool(self.table.flags[self.index] & FIRST_INIT)
+
+    @property
+    def is_middle_init(self):
+        return bool(self.table.flags[self.index] & MIDDLE_INIT)
+
+    def get_director_constructor(self):
+        return [self.first, self.middle, self.last, self.suffix, self]
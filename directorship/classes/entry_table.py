@@ -0,0 +1,195 @@
+from array import array
+from .firm import Firm
+from .entry import Entry, FIRST_INIT, MIDDLE_INIT, MIDDLE_VOID, SUFFIX_VOID
+
+# Categorical columns of an EntryTable
+STRING_COLUMNS = ["full_name", "first", "first_init", "middle", "middle_init", "last", "suffix", "address"]
+
+
+def get_first_values(first):
+    """Return the first initial and flags of a First Name, which must not be empty."""
+    return first[0], FIRST_INIT if len(first) == 1 else 0
+
+
+def get_middle_values(middle):
+    """Return the Middle Name, middle initial and flags of a Middle Name, with "0" denoting a void Middle Name."""
+    if middle == "0":
+        return "", "", MIDDLE_VOID
+    return middle, middle[0], MIDDLE_INIT if len(middle) == 1 else 0
+
+
+def get_suffix_values(suffix):
+    """Return the Suffix and flags of a Suffix, with "0" denoting a void Suffix."""
+    if suffix == "0":
+        return "", SUFFIX_VOID
+    return suffix, 0
+
+
+def get_name_values(first, middle, suffix):
+    """Return the first initial, Middle Name, middle initial, Suffix and flags of a row, with "0" denoting a void
+    Middle Name or Suffix."""
+    first_init, first_flags = get_first_values(first)
+    middle, middle_init, middle_flags = get_middle_values(middle)
+    suffix, suffix_flags = get_suffix_values(suffix)
+    return first_init, middle, middle_init, suffix, first_flags | middle_flags | suffix_flags
+
+
+class StringColumn:
+    """
+    A categorical column of strings. Each distinct string is stored once in values,
+    and each row holds the integer code of its string.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.code_map = {}
+        self.codes = array('I')
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, r):
+        return self.values[self.codes[r]]
+
+    def get_code(self, value):
+        code = self.code_map.get(value)
+        if code is None:
+            code = len(self.values)
+            self.code_map[value] = code
+            self.values.append(value)
+        return code
+
+    def get_codes(self, values):
+        """Return the codes of distinct values, adding the new ones in order, as get_code would one by one."""
+        code_map = self.code_map
+        num_values = len(code_map)
+        codes = [code_map.setdefault(value, len(code_map)) for value in values]
+        self.values.extend([value for value, code in zip(values, codes) if code >= num_values])
+        return codes
+
+    def append(self, value):
+        code = self.get_code(value)
+        self.codes.append(code)
+        return code
+
+    def extend(self, other):
+        """Append the rows of another StringColumn. Its new values are added in their order in other, which
+        is their order of first appearance, so codes are the same as if the rows were appended one by one."""
+        code_remap = self.get_codes(other.values)
+        self.codes.extend(array('I', map(code_remap.__getitem__, other.codes)))
+
+
+class EntryTable:
+    """
+    The entries constructed from a .csv table, stored column by column.
+
+    String fields are categorical StringColumns, the firm of each row is an integer
+    index into firm_ids and firm_names, and the initial and void flags of each row
+    are packed into a single byte. Rows are accessed through lightweight Entry views.
+    """
+
+    def __init__(self):
+        self.firm_ids = []
+        self.firm_names = []
+        self.firm_index_map = {}
+        self.firms = array('I')
+        self.full_name = StringColumn()
+        self.first = StringColumn()
+        self.first_init = StringColumn()
+        self.middle = StringColumn()
+        self.middle_init = StringColumn()
+        self.last = StringColumn()
+        self.suffix = StringColumn()
+        self.address = StringColumn()
+        self.flags = bytearray()
+
+    def __len__(self):
+        return len(self.flags)
+
+    def __iter__(self):
+        for r in range(len(self)):
+            yield Entry(self, r)
+
+    def __getitem__(self, r):
+        return Entry(self, r)
+
+    def get_firm_map(self):
+        """Return a new mapping from firm_id to Firm, in order of first appearance, in which no firm records
+        directors yet."""
+        firm_map = {}
+        for index, (firm_id, firm_name) in enumerate(zip(self.firm_ids, self.firm_names)):
+            firm_map[firm_id] = Firm(firm_name, firm_id, index)
+        return firm_map
+
+    def append(self, firm_id, firm_name, full_name, first, middle, last, suffix, address):
+        """Add a row, with "0" denoting a void Middle Name or Suffix, and return its Entry view."""
+        first_init, middle, middle_init, suffix, flags = get_name_values(first, middle, suffix)
+
+        firm_index = self.firm_index_map.get(firm_id)
+        if firm_index is None:
+            firm_index = len(self.firm_ids)
+            self.firm_index_map[firm_id] = firm_index
+            self.firm_ids.append(firm_id)
+            self.firm_names.append(firm_name)
+
+        self.firms.append(firm_index)
+        self.full_name.append(full_name)
+        self.first.append(first)
+        self.first_init.append(first_init)
+        self.middle.append(middle)
+        self.middle_init.append(middle_init)
+        self.last.append(last)
+        self.suffix.append(suffix)
+        self.address.append(address)
+        self.flags.append(flags)
+        return Entry(self, len(self.flags) - 1)
+
+    def extend(self, other):
+        """Append the rows of another EntryTable, giving the same table as appending them one by one."""
+        firm_remap = []
+        for firm_id, firm_name in zip(other.firm_ids, other.firm_names):
+            firm_index = self.firm_index_map.get(firm_id)
+            if firm_index is None:
+                firm_index = len(self.firm_ids)
+                self.firm_index_map[firm_id] = firm_index
+                self.firm_ids.append(firm_id)
+                self.firm_names.append(firm_name)
+            firm_remap.append(firm_index)
+        self.firms.extend(array('I', map(firm_remap.__getitem__, other.firms)))
+        for name in STRING_COLUMNS:
+            getattr(self, name).extend(getattr(other, name))
+        self.flags.extend(other.flags)
+
+
+class BlockTable(EntryTable):
+    """
+    Some rows of an EntryTable, stored under their row numbers in the whole table rather than from 0, so that
+    their Entry views hash, and sets of them iterate, as those of the whole table would. The integer columns
+    are dicts from row numbers, and the firm columns are those of the whole table.
+
+    Used to process the rows of a few blocks at a time without holding the whole table, see out_of_core.
+    """
+
+    def __init__(self, firm_ids, firm_names):
+        super().__init__()
+        self.firm_ids = firm_ids
+        self.firm_names = firm_names
+        self.firms = {}
+        self.flags = {}
+        for name in STRING_COLUMNS:
+            getattr(self, name).codes = {}
+
+    def __iter__(self):
+        for r in self.flags:
+            yield Entry(self, r)
+
+    def append_row(self, row_number, firm_index, full_name, first, middle, last, suffix, address):
+        """Add the row of the given row number and firm index, and return its Entry view."""
+        first_init, middle, middle_init, suffix, flags = get_name_values(first, middle, suffix)
+        for name, value in zip(STRING_COLUMNS, (full_name, first, first_init, middle, middle_init, last, suffix,
+                                                address)):
+            column = getattr(self, name)
+            column.codes[row_number] = column.get_code(value)
+        self.firms[row_number] = firm_index
+        self.flags[row_number] = flags
+        return Entry(self, row_number)
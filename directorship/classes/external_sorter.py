@@ -0,0 +1,76 @@
+import heapq
+import os
+import pickle
+import tempfile
+
+# Number of items pickled together in a run file
+BATCH_SIZE = 1000
+# Maximum number of run files read at once when merging. Runs beyond it are first merged into larger runs
+MAX_OPEN_RUNS = 256
+
+
+class ExternalSorter:
+    """
+    Sorts more items than fit in memory at once.
+
+    Items are added in any order, and held in memory until run_size of them have been added. They are then
+    sorted and written to a run file in directory. Iterating over the sorter merges the runs, reading a batch of
+    each at a time, so memory holds at most run_size items while adding and a batch per run while iterating.
+    Items must be picklable and comparable, and equal items are yielded in no particular order.
+    """
+
+    def __init__(self, directory, run_size):
+        self.directory = directory
+        self.run_size = run_size
+        self.items = []
+        self.run_paths = []
+        self.num_items = 0
+
+    def __len__(self):
+        return self.num_items
+
+    def __iter__(self):
+        if not self.run_paths:
+            self.items.sort()
+            return iter(self.items)
+        if self.items:
+            self.write_run(self.items)
+        # Merge the oldest runs into larger ones until they can all be read at once
+        while len(self.run_paths) > MAX_OPEN_RUNS:
+            paths = self.run_paths[:MAX_OPEN_RUNS]
+            del self.run_paths[:MAX_OPEN_RUNS]
+            self.write_run(heapq.merge(*[read_run(path) for path in paths]))
+        return heapq.merge(*[read_run(path) for path in self.run_paths])
+
+    def add(self, item):
+        self.items.append(item)
+        self.num_items += 1
+        if len(self.items) >= self.run_size:
+            self.write_run(self.items)
+
+    def write_run(self, items):
+        if items is self.items:
+            items.sort()
+            self.items = []
+        with tempfile.NamedTemporaryFile(dir=self.directory, prefix="run-", suffix=".pickle", delete=False) as f:
+            batch = []
+            for item in items:
+                batch.append(item)
+                if len(batch) == BATCH_SIZE:
+                    pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    batch = []
+            if batch:
+                pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.run_paths.append(f.name)
+
+
+def read_run(path):
+    """Yield the items of a run file in order, and remove the file once they have all been read."""
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                break
+            yield from batch
+    os.remove(path)
@@ -1,16 +1,26 @@
+from array import array
+from bisect import bisect_left
+
 
 class Firm:
 
-    def __init__(self, name, firm_id):
+    __slots__ = ("name", "firm_id", "index", "directors")
+
+    def __init__(self, name, firm_id, index):
         self.name = name
         self.firm_id = firm_id
-        self.directors = set()
+        # Dense integer index, in order of first appearance in the input
+        self.index = index
+        # Sorted indices of the directors of the firm
+        self.directors = array('I')
 
     def __str__(self):
         return self.firm_id
 
     def add_director(self, director):
-        self.directors.add(director)
+        k = bisect_left(self.directors, director.index)
+        if k == len(self.directors) or self.directors[k] != director.index:
+            self.directors.insert(k, director.index)
 
     def get_directors(self):
         return self.directors
@@ -18,11 +28,8 @@ class Firm:
     def get_adj_matrix_ref(self):
         return self.firm_id
 
-    def get_num_links(self, other_firm):
-        return len(self.directors.intersection(other_firm.directors))
-
-
-
-
-
+    def get_links(self):
+        return self.directors
 
+    def get_num_links(self, other_firm):
+        return len(set(self.directors).intersection(other_firm.directors))
@@ -1,20 +1,37 @@
+from .projection import Projection
+
 
 class Graph:
 
     def __init__(self, object_list):
         self.objects = object_list
         self.size = len(object_list)
+        self.projection = None
+        self.references = None
 
     def get_value(self, r, c):
         obj1 = self.objects[r]
         obj2 = self.objects[c]
         return obj1.get_num_links(obj2)
 
+    def get_projection(self):
+        if self.projection is None:
+            self.projection = Projection(self.objects)
+        return self.projection
+
+    def get_row(self, r):
+        return self.get_projection().get_row(r)
+
+    def get_edges(self, start=0, stop=None):
+        return self.get_projection().get_edges(start, stop)
+
     def get_references(self):
-        return [o.get_adj_matrix_ref() for o in self.objects]
+        if self.references is None:
+            self.references = [o.get_adj_matrix_ref() for o in self.objects]
+        return self.references
 
     def get_reference(self, r):
-        return self.objects[r].get_adj_matrix_ref()
+        return self.get_references()[r]
 
     def get_size(self):
         return self.size
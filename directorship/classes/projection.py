@@ -0,0 +1,72 @@
+from bisect import bisect_right
+
+
+class Projection:
+    """
+    Sparse one-mode projection of the director-firm bipartite graph.
+
+    The incidence between the projected objects and their links (the firms of a
+    Director, or the directors of a Firm) is built once. The number of links shared
+    by two objects is then found by walking from each object through its links to
+    the other objects holding them, so only pairs with a non-zero value are visited.
+    """
+
+    def __init__(self, object_list):
+        self.size = len(object_list)
+        # rows[r] holds the column index of each link of object r
+        # columns[c] holds, in increasing order, the rows of the objects holding link c
+        self.rows = []
+        self.columns = []
+        column_map = {}
+        for r, o in enumerate(object_list):
+            row = []
+            for link in o.get_links():
+                c = column_map.get(link)
+                if c is None:
+                    c = len(self.columns)
+                    column_map[link] = c
+                    self.columns.append([])
+                self.columns[c].append(r)
+                row.append(c)
+            self.rows.append(row)
+
+    def get_row(self, r):
+        """Return the sorted list of (c, value) pairs with c > r and a non-zero value."""
+        counts = {}
+        for c in self.rows[r]:
+            column = self.columns[c]
+            for k in range(bisect_right(column, r), len(column)):
+                other = column[k]
+                counts[other] = counts.get(other, 0) + 1
+        return sorted(counts.items())
+
+    def get_row_cost(self, r):
+        """Return the number of (c, link) pairs with c > r, the work needed to compute row r."""
+        cost = 0
+        for c in self.rows[r]:
+            column = self.columns[c]
+            cost += len(column) - bisect_right(column, r)
+        return cost
+
+    def get_partition(self, num_parts):
+        """Split the rows into at most num_parts contiguous (start, stop) ranges of similar cost."""
+        costs = [self.get_row_cost(r) for r in range(self.size)]
+        target = sum(costs) / max(num_parts, 1)
+        partition = []
+        start = 0
+        accumulated = 0
+        for r, cost in enumerate(costs):
+            accumulated += cost
+            if accumulated >= target * (len(partition) + 1) and len(partition) < num_parts - 1:
+                partition.append((start, r + 1))
+                start = r + 1
+        partition.append((start, self.size))
+        return partition
+
+    def get_edges(self, start=0, stop=None):
+        """Yield (r, c, value) for each non-zero pair r < c, with start <= r < stop, in row-major order."""
+        if stop is None:
+            stop = self.size
+        for r in range(start, stop):
+            for c, value in self.get_row(r):
+                yield r, c, value
@@ -0,0 +1,64 @@
+import pickle
+from array import array
+from .director import Director
+
+# Incremented whenever the saved layout changes, so that older states are rejected rather than misread
+STATE_VERSION = 1
+
+
+class ResolutionState:
+    """
+    The entries and directors of a run, saved with its output so that rows added later can be processed
+    by entry_handler.update_directors without processing all rows again.
+
+    blocks maps each (first_init, last, suffix) key to the list of directors resolved from the entries with
+    those values, in order of first appearance, as filled in by entry_handler.get_directors. inputs lists
+    the input files whose rows are in table, in order.
+    """
+
+    def __init__(self, table, blocks, inputs):
+        self.table = table
+        self.blocks = blocks
+        self.inputs = inputs
+
+    def get_firm_map(self):
+        return self.table.get_firm_map()
+
+    def save(self, path):
+        # Directors are saved column by column, with entries referenced by index
+        block_sizes = array('I')
+        names = []
+        flags = bytearray()
+        entry_counts = array('I')
+        entry_indices = array('I')
+        for directors in self.blocks.values():
+            block_sizes.append(len(directors))
+            for d in directors:
+                names.append((d.first, d.middle, d.last, d.suffix))
+                flags.append(d.flagged_for_duplicate_entry)
+                entry_counts.append(len(d.entries))
+                entry_indices.extend([e.index for e in d.entries])
+        directors = (block_sizes, names, flags, entry_counts, entry_indices)
+        with open(path, 'wb') as f:
+            pickle.dump((STATE_VERSION, self.table, list(self.blocks), directors, self.inputs), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if not isinstance(state, tuple) or state[0] != STATE_VERSION:
+            raise ValueError("'{}' was saved by an incompatible version of directorship".format(path))
+        _, table, keys, (block_sizes, names, flags, entry_counts, entry_indices), inputs = state
+        blocks = {}
+        director_columns = zip(names, flags, entry_counts)
+        start = 0
+        for k, block_size in zip(keys, block_sizes):
+            directors = []
+            for _ in range(block_size):
+                (first, middle, last, suffix), flagged, entry_count = next(director_columns)
+                record = (first, middle, last, suffix, entry_indices[start:start + entry_count], bool(flagged))
+                directors.append(Director.from_record(record, table))
+                start += entry_count
+            blocks[k] = directors
+        return ResolutionState(table, blocks, inputs)
@@ -0,0 +1,37 @@
+
+class UnionFind:
+    """
+    Disjoint sets over the integers 0, ..., size - 1, with union by size and path halving.
+    """
+
+    def __init__(self, size):
+        self.parents = list(range(size))
+        self.sizes = [1] * size
+
+    def find(self, x):
+        parents = self.parents
+        while parents[x] != x:
+            parents[x] = parents[parents[x]]
+            x = parents[x]
+        return x
+
+    def union(self, x, y):
+        x = self.find(x)
+        y = self.find(y)
+        if x == y:
+            return x
+        if self.sizes[x] < self.sizes[y]:
+            x, y = y, x
+        self.parents[y] = x
+        self.sizes[x] += self.sizes[y]
+        return x
+
+    def get_sets(self):
+        """Return a mapping from the root of each set to the list of its elements, in increasing order."""
+        sets = {}
+        for x in range(len(self.parents)):
+            root = self.find(x)
+            if root not in sets:
+                sets[root] = []
+            sets[root].append(x)
+        return sets
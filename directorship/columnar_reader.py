@@ -0,0 +1,240 @@
+"""
+Reading of inputs stored as Parquet or Feather (Arrow IPC) files rather than csv.
+
+The columns at the indices of csv_reader are read by their position in the schema, so the same indices serve csv
+and columnar copies of a table, and the other columns are never read from disk. Columns of other types are read
+as their csv text, e.g. an integer firm id 7 as "7", and missing values as "".
+
+Rather than appending rows one at a time, each batch of rows is dictionary encoded, and the string columns and
+flags of the EntryTable are computed once per distinct value, in order of first appearance, and then taken for
+all rows at once. The table is the same as that read from the equivalent csv by a CsvReader.
+Requires pyarrow.
+"""
+import os
+from array import array
+from . import csv_reader
+from .classes.entry_table import get_first_values, get_middle_values, get_suffix_values
+from .classes.firm import Firm
+from .csv_reader import CsvReader, DEFAULT_CHUNK_SIZE
+
+# Input formats by file extension
+COLUMNAR_FORMATS = {".parquet": "parquet", ".pq": "parquet", ".feather": "feather", ".arrow": "feather"}
+# Number of rows appended at a time by parse_input, larger than a chunk since no entries are yielded
+PARSE_BATCH_SIZE = 1 << 16
+
+
+def import_pyarrow():
+    """Return the pyarrow module, raising an ImportError if missing."""
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.feather
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Reading Parquet and Feather inputs requires pyarrow. "
+                          "Install it with 'pip install .[columnar]'.")
+    return pyarrow
+
+
+def get_input_format(path):
+    """Return "parquet" or "feather" for a columnar input, by its extension, or "csv" otherwise."""
+    return COLUMNAR_FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+
+
+def open_input(path, chunk_size=DEFAULT_CHUNK_SIZE, table=None, firm_map=None):
+    """Return a ColumnarReader for a Parquet or Feather input, or a CsvReader otherwise."""
+    if get_input_format(path) == "csv":
+        return CsvReader(path, chunk_size, table, firm_map)
+    return ColumnarReader(path, chunk_size, table, firm_map)
+
+
+def parse_input(path, workers=1):
+    """Parse the input at path into an EntryTable, as csv_reader.parse_csv does for a csv.
+
+    Columnar inputs are read in a single process, whatever workers is.
+
+    :return: The EntryTable, and the (line number, number of columns, reason) of each row skipped, see
+        CsvReader.bad_rows
+    """
+    if get_input_format(path) == "csv":
+        return csv_reader.parse_csv(path, workers)
+    with ColumnarReader(path, PARSE_BATCH_SIZE) as reader:
+        for columns in reader.read_batches():
+            reader.append_columns(columns)
+    return reader.table, reader.bad_rows
+
+
+class ColumnarReader(CsvReader):
+    """
+    Streams the entries of a Parquet or Feather table, as CsvReader does those of a csv.
+
+    If the table has fewer columns than the indices of csv_reader require, every row is skipped, as are rows
+    with an empty First or Middle Name. They are recorded in bad_rows under their line number in the equivalent
+    csv, i.e. counting the header row as line 1.
+    """
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE, table=None, firm_map=None):
+        super().__init__(path, chunk_size, table, firm_map)
+        self.pa = import_pyarrow()
+        self.input_format = get_input_format(path)
+        self.parquet_file = None
+        self.feather_source = None
+        self.feather_table = None
+        self.column_names = None
+        self.num_columns = 0
+        self.num_rows_read = 0
+
+    def __enter__(self):
+        pa = self.pa
+        if self.input_format == "parquet":
+            self.parquet_file = pa.parquet.ParquetFile(self.path, memory_map=True)
+            names = self.parquet_file.schema_arrow.names
+            num_rows = self.parquet_file.metadata.num_rows
+        else:
+            # Memory-mapped, so only the pages of the columns read are loaded
+            self.feather_source = pa.memory_map(self.path)
+            names = pa.ipc.open_file(self.feather_source).schema.names
+            num_rows = None
+        if len(names) < csv_reader.get_num_columns():
+            if num_rows is None:
+                num_rows = pa.feather.read_table(self.feather_source, columns=[]).num_rows
+            self.bad_rows = [(line_number, len(names), csv_reader.TOO_FEW_COLUMNS)
+                             for line_number in range(2, num_rows + 2)]
+            return self
+        indices = [csv_reader.FIRM_ID_COL, csv_reader.FIRM_NAME_COL, csv_reader.FULL_NAME_COL, csv_reader.FIRST_COL,
+                   csv_reader.MIDDLE_COL, csv_reader.LAST_COL, csv_reader.SUFFIX_COL, csv_reader.ADDRESS_COL]
+        self.column_names = [names[i] for i in indices]
+        self.num_columns = len(names)
+        if self.input_format == "feather":
+            self.feather_table = pa.feather.read_table(self.feather_source, columns=sorted(set(indices)))
+        return self
+
+    def close(self):
+        if self.parquet_file is not None:
+            self.parquet_file.close()
+            self.parquet_file = None
+        self.feather_table = None
+        if self.feather_source is not None:
+            self.feather_source.close()
+            self.feather_source = None
+
+    def read_batches(self):
+        """Yield the (firm id, firm name, full name, first, middle, last, suffix, address) columns of batches of
+        at most chunk_size rows, as string arrays, without the rows of bad_rows."""
+        if self.column_names is None:
+            return
+        pa = self.pa
+        pc = pa.compute
+        if self.parquet_file is not None:
+            batches = self.parquet_file.iter_batches(batch_size=self.chunk_size,
+                                                     columns=sorted(set(self.column_names)))
+        else:
+            batches = self.feather_table.to_batches(max_chunksize=self.chunk_size)
+        for batch in batches:
+            columns = []
+            for name in self.column_names:
+                column = batch.column(name)
+                if not pa.types.is_string(column.type):
+                    column = column.cast(pa.string())
+                columns.append(column.fill_null(""))
+            empty_first = pc.equal(columns[3], "")
+            empty = pc.or_(empty_first, pc.equal(columns[4], ""))
+            if pc.any(empty).as_py():
+                for position in pc.indices_nonzero(empty).to_pylist():
+                    reason = csv_reader.EMPTY_FIRST_NAME if empty_first[position].as_py() \
+                        else csv_reader.EMPTY_MIDDLE_NAME
+                    self.bad_rows.append((self.num_rows_read + position + 2, self.num_columns, reason))
+                columns = [column.filter(pc.invert(empty)) for column in columns]
+            self.num_rows_read += len(batch)
+            yield columns
+
+    def read_chunks(self):
+        """Yield lists of at most chunk_size entries, in table order."""
+        for columns in self.read_batches():
+            start = len(self.table)
+            self.append_columns(columns)
+            yield [self.table[r] for r in range(start, len(self.table))]
+
+    def read_values(self, csv_reader=None, first_line_number=1):
+        """Yield the (firm id, firm name, full name, first, middle, last, suffix, address) values of each row."""
+        for columns in self.read_batches():
+            yield from zip(*[column.to_pylist() for column in columns])
+
+    def append_columns(self, columns):
+        """Append the rows of a batch of read_batches to table, adding a Firm to firm_map for each new firm id."""
+        pc = self.pa.compute
+        table = self.table
+        firm_id, firm_name, full_name, first, middle, last, suffix, address = columns
+        if len(firm_id) == 0:
+            return
+
+        # Firms, named as in their first row
+        num_firms = len(table.firm_ids)
+        firm_indices, firm_ids = self.encode(firm_id)
+        firm_remap = [table.firm_index_map.setdefault(value, len(table.firm_index_map)) for value in firm_ids]
+        new_codes = [code for code, firm_index in enumerate(firm_remap) if firm_index >= num_firms]
+        if new_codes:
+            codes = firm_indices.to_pylist()
+            positions = []
+            position = 0
+            for code in new_codes:
+                # Values are encoded in order of first appearance, so each first appears after the previous one
+                position = codes.index(code, position)
+                positions.append(position)
+            table.firm_ids.extend([firm_ids[code] for code in new_codes])
+            table.firm_names.extend(firm_name.take(positions).to_pylist())
+        table.firms.extend(self.take(firm_remap, firm_indices))
+        for value, name in zip(table.firm_ids[num_firms:], table.firm_names[num_firms:]):
+            if value not in self.firm_map:
+                self.firm_map[value] = Firm(name, value, len(self.firm_map))
+
+        # Name columns, and the flags of each of their values, with the helpers of EntryTable.append
+        for column, values in [(table.full_name, full_name), (table.last, last), (table.address, address)]:
+            indices, distinct = self.encode(values)
+            column.codes.extend(self.take(column.get_codes(distinct), indices))
+
+        first_indices, firsts = self.encode(first)
+        first_inits, first_flags = zip(*map(get_first_values, firsts))
+        table.first.codes.extend(self.take(table.first.get_codes(firsts), first_indices))
+        table.first_init.codes.extend(self.take([table.first_init.get_code(value) for value in first_inits],
+                                                first_indices))
+
+        middle_indices, middles = self.encode(middle)
+        middle_values, middle_inits, middle_flags = zip(*map(get_middle_values, middles))
+        table.middle.codes.extend(self.take([table.middle.get_code(value) for value in middle_values],
+                                            middle_indices))
+        table.middle_init.codes.extend(self.take([table.middle_init.get_code(value) for value in middle_inits],
+                                                 middle_indices))
+
+        suffix_indices, suffixes = self.encode(suffix)
+        suffix_values, suffix_flags = zip(*map(get_suffix_values, suffixes))
+        table.suffix.codes.extend(self.take([table.suffix.get_code(value) for value in suffix_values],
+                                            suffix_indices))
+
+        flags = pc.bit_wise_or(pc.bit_wise_or(self.take_array(first_flags, first_indices, self.pa.uint8()),
+                                              self.take_array(middle_flags, middle_indices, self.pa.uint8())),
+                               self.take_array(suffix_flags, suffix_indices, self.pa.uint8()))
+        table.flags.extend(self.get_buffer(flags))
+
+    def encode(self, column):
+        """Return the index of each row of a string array into its distinct values, and the distinct values in
+        order of first appearance."""
+        encoded = column.dictionary_encode()
+        return encoded.indices, encoded.dictionary.to_pylist()
+
+    def take_array(self, values, indices, value_type):
+        return self.pa.compute.take(self.pa.array(list(values), type=value_type), indices)
+
+    def take(self, values, indices):
+        """Return array('I') of the value of each index."""
+        codes = array('I')
+        codes.frombytes(self.get_buffer(self.take_array(values, indices, self.pa.uint32())))
+        return codes
+
+    def get_buffer(self, values):
+        """Return the data of an array of fixed width integers without nulls."""
+        if len(values) == 0:
+            return b""
+        width = values.type.bit_width // 8
+        return memoryview(values.buffers()[1])[values.offset * width:(values.offset + len(values)) * width]
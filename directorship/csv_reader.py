@@ -1,6 +1,9 @@
 import csv
+import io
+import mmap
+from multiprocessing import Pool
 from .classes.firm import Firm
-from .classes.entry import Entry
+from .classes.entry_table import EntryTable
 
 ###########################################################
 #  Change these values depending on the .csv being read.  #
@@ -32,44 +35,242 @@ ADDRESS_COL = 7
 ###################################
 
 
+DEFAULT_CHUNK_SIZE = 10000
+
+# Number of byte ranges parsed by each worker of parse_csv, so that slow ranges do not hold back the others
+RANGES_PER_WORKER = 4
+# Row appended to each byte range parsed by parse_csv, to check that the range ends at a row boundary
+RANGE_END_ROW = b"range end\n"
+
+
+def get_num_columns():
+    """Return the number of columns a row needs for all the indices above to be in bounds."""
+    return 1 + max(FIRM_ID_COL, FIRM_NAME_COL, FULL_NAME_COL, FIRST_COL, MIDDLE_COL, LAST_COL, SUFFIX_COL,
+                   ADDRESS_COL)
+
+
+# Reasons for which rows are skipped, see CsvReader.bad_rows
+TOO_FEW_COLUMNS = "too few columns"
+EMPTY_FIRST_NAME = "empty first name"
+EMPTY_MIDDLE_NAME = "empty middle name"
+
+
+def get_bad_rows_message(bad_rows):
+    """Return a message reporting skipped rows, given as (line number, number of columns, reason)."""
+    lines = ", ".join(str(line_number) for line_number, _, _ in bad_rows[:10])
+    if len(bad_rows) > 10:
+        lines += ", ..."
+    reasons = {}
+    for _, _, reason in bad_rows:
+        reasons[reason] = reasons.get(reason, 0) + 1
+    return ("{} rows were skipped ({}), at lines {}. Rows need the {} columns of the index values in csv_reader.py, "
+            "and a First and Middle Name, with 0 for a void Middle Name.\n"
+            "Current Indices:\n"
+            "\tfirm id = {}\n"
+            "\tfirm name = {}\n"
+            "\tfull name = {}\n"
+            "\tfirst name = {}\n"
+            "\tmiddle name = {}\n"
+            "\tlast name = {}\n"
+            "\tsuffix = {}\n"
+            "\taddress = {}".format(len(bad_rows), ", ".join("{} {}".format(count, reason)
+                                                             for reason, count in reasons.items()),
+                                    lines, get_num_columns(), FIRM_ID_COL, FIRM_NAME_COL, FULL_NAME_COL, FIRST_COL,
+                                    MIDDLE_COL, LAST_COL, SUFFIX_COL, ADDRESS_COL))
+
+
+class CsvReader:
+    """
+    Streams the entries of a .csv table, creating a Firm for each new firm id as it is read.
+    The rows are stored in the EntryTable table, and entries are yielded as views of its rows.
+
+    Use as a context manager, so the file is closed once reading stops:
+
+        with CsvReader(path) as reader:
+            for chunk in reader.read_chunks():
+                ...
+        firm_map = reader.firm_map
+
+    Rows are appended to table and firm_map if given, e.g. to add the rows of a file to those read before.
+    Rows with too few columns, or an empty First or Middle Name, are skipped, and recorded in bad_rows as
+    (line number, number of columns, reason).
+    """
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE, table=None, firm_map=None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.firm_map = {} if firm_map is None else firm_map
+        self.table = EntryTable() if table is None else table
+        self.bad_rows = []
+        self.csv_file = None
+
+    def __enter__(self):
+        self.csv_file = open(self.path, newline='')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+
+    def read_chunks(self):
+        """Yield lists of at most chunk_size entries, in file order."""
+        csv_reader = csv.reader(self.csv_file)
+        next(csv_reader)  # ignore header row
+        chunk = []
+        for entry in self.read_rows(csv_reader):
+            chunk.append(entry)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def read_entries(self):
+        """Yield entries one at a time, in file order."""
+        for chunk in self.read_chunks():
+            yield from chunk
+
+    def read_values(self, csv_reader=None, first_line_number=1):
+        """Yield the (firm id, firm name, full name, first, middle, last, suffix, address) values of the rows of
+        csv_reader, whose first line is line first_line_number of the file, skipping the rows of bad_rows.
+        By default, the rows of the file after its header row are read."""
+        if csv_reader is None:
+            csv_reader = csv.reader(self.csv_file)
+            next(csv_reader)  # ignore header row
+        num_columns = get_num_columns()
+        line_number = first_line_number + csv_reader.line_num
+        for row_values in csv_reader:
+            if len(row_values) < num_columns:
+                self.bad_rows.append((line_number, len(row_values), TOO_FEW_COLUMNS))
+            elif not row_values[FIRST_COL]:
+                self.bad_rows.append((line_number, len(row_values), EMPTY_FIRST_NAME))
+            elif not row_values[MIDDLE_COL]:
+                self.bad_rows.append((line_number, len(row_values), EMPTY_MIDDLE_NAME))
+            else:
+                yield (row_values[FIRM_ID_COL], row_values[FIRM_NAME_COL], row_values[FULL_NAME_COL],
+                       row_values[FIRST_COL], row_values[MIDDLE_COL], row_values[LAST_COL], row_values[SUFFIX_COL],
+                       row_values[ADDRESS_COL])
+            line_number = first_line_number + csv_reader.line_num
+
+    def read_rows(self, csv_reader, first_line_number=1):
+        """Yield the entries of the rows of csv_reader, as read_values, adding a Firm to firm_map for each new
+        firm id."""
+        for values in self.read_values(csv_reader, first_line_number):
+            firm_id = values[0]
+            if firm_id not in self.firm_map:
+                self.firm_map[firm_id] = Firm(values[1], firm_id, len(self.firm_map))
+            yield self.table.append(*values)
+
+
 def read_csv(path):
-    csv_file = open(path, newline='')
-    csv_reader = csv.reader(csv_file)
-    next(csv_reader)  # ignore header row
-    firm_map = {}
-    entries = []
-    for row_values in csv_reader:
-
-        # retrieve values from csv
-        try:
-            firm_id = row_values[FIRM_ID_COL]
-            firm_name = row_values[FIRM_NAME_COL]
-            full_name = row_values[FULL_NAME_COL]
-            first = row_values[FIRST_COL]
-            middle = row_values[MIDDLE_COL]
-            last = row_values[LAST_COL]
-            suffix = row_values[SUFFIX_COL]
-            address = row_values[ADDRESS_COL]
-        except IndexError:
-            raise IndexError("At least one index value in csv_reader.py is out of bounds for given input csv.\n"
-                             "Current Indices:\n"
-                             "\tfirm id = {}\n"
-                             "\tfirm name = {}\n"
-                             "\tfull name = {}\n"
-                             "\tfirst name = {}\n"
-                             "\tmiddle name = {}\n"
-                             "\tlast name = {}\n"
-                             "\tsuffix = {}\n"
-                             "\taddress = {}".format(FIRM_ID_COL, FIRM_NAME_COL, FULL_NAME_COL, FIRST_COL,
-                                                     MIDDLE_COL, LAST_COL, SUFFIX_COL, ADDRESS_COL))
-
-        # construct entry
-        entry = Entry(firm_id, firm_name, full_name, first, middle, last, suffix, address)
-        entries.append(entry)
-
-        # add firm to firm_map
-        if firm_id not in firm_map:
-            firm = Firm(firm_name, firm_id)
-            firm_map[firm_id] = firm
-
-    return entries, firm_map
+    with CsvReader(path) as reader:
+        for _ in reader.read_chunks():
+            pass
+    return reader.table, reader.firm_map
+
+
+def parse_csv(path, workers=1):
+    """Parse the csv at path into an EntryTable, with workers processes if workers > 1.
+
+    The file is memory-mapped and split into byte ranges ending at row boundaries, see get_row_ranges, which
+    the workers parse into EntryTables of the configured columns. The tables are then appended in file order,
+    giving the same table as reading the file with a CsvReader.
+    The boundaries found by get_row_ranges are checked with the csv module as the ranges are parsed. If one
+    falls within a quoted field, e.g. after a quote character within an unquoted field, the file is parsed
+    again by a single CsvReader.
+
+    :return: The EntryTable, and the (line number, number of columns, reason) of each row skipped, see
+        CsvReader.bad_rows, in file order
+    """
+    if workers <= 1:
+        with CsvReader(path) as reader:
+            for _ in reader.read_chunks():
+                pass
+        return reader.table, reader.bad_rows
+    with open(path, 'rb') as f:
+        if f.seek(0, io.SEEK_END) == 0:
+            return EntryTable(), []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            tasks = get_row_ranges(mapped, workers * RANGES_PER_WORKER)
+            header = mapped[:tasks[0][0]] if tasks else mapped[:]
+    # The header row must be followed by RANGE_END_ROW alone, as for the ranges in _parse_range
+    if len(list(csv.reader(io.TextIOWrapper(io.BytesIO(header + RANGE_END_ROW), newline='')))) != 2:
+        return parse_csv(path)
+    table = EntryTable()
+    bad_rows = []
+    with Pool(workers, initializer=_init_parse_worker, initargs=(path,)) as pool:
+        for range_table, range_bad_rows, ends_at_row_boundary in pool.imap(_parse_range, tasks):
+            if not ends_at_row_boundary:
+                return parse_csv(path)
+            table.extend(range_table)
+            bad_rows += range_bad_rows
+    return table, bad_rows
+
+
+def get_row_ranges(mapped, num_ranges):
+    """Split the rows of a memory-mapped csv, after its header row, into about num_ranges byte ranges.
+
+    A range ends at a newline outside of quoted fields, that is, one preceded by an even number of quote
+    characters, so that newlines within quoted fields do not split rows. This assumes that quote characters
+    only appear around and doubled within quoted fields, as written by csv.writer; parse_csv checks it.
+
+    :return: A list of (start, stop, line number of start) byte ranges covering the rows
+    """
+    size = len(mapped)
+
+    def get_row_end(start, position):
+        # Return the end of the first row ending at or after position, in a range starting at start
+        num_quotes = mapped[start:position].count(b'"')
+        while True:
+            newline = mapped.find(b'\n', position)
+            if newline == -1:
+                return size
+            num_quotes += mapped[position:newline].count(b'"')
+            position = newline + 1
+            if num_quotes % 2 == 0:
+                return position
+
+    header_end = get_row_end(0, 0)
+    line_number = 1 + mapped[:header_end].count(b'\n')
+    range_size = max(1, (size - header_end) // num_ranges)
+    ranges = []
+    start = header_end
+    while start < size:
+        stop = get_row_end(start, min(start + range_size, size))
+        ranges.append((start, stop, line_number))
+        line_number += mapped[start:stop].count(b'\n')
+        start = stop
+    return ranges
+
+
+_parse_path = None
+
+def _init_parse_worker(path):
+    global _parse_path
+    _parse_path = path
+
+def _parse_range(task):
+    """Parse a byte range of get_row_ranges, returning its EntryTable, its skipped rows, and whether the range
+    ends at a row boundary."""
+    start, stop, line_number = task
+    with open(_parse_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        data = mapped[start:stop]
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    # Decode as open() does in CsvReader
+    csv_file = io.TextIOWrapper(io.BytesIO(data + RANGE_END_ROW), newline='')
+    rows = csv.reader(csv_file)
+    reader = CsvReader(_parse_path)
+    for _ in reader.read_rows(rows, line_number):
+        pass
+    # RANGE_END_ROW is skipped as a row of one column on the last line, unless the range ends within a quoted
+    # field, which then extends over it from an earlier line
+    range_end = (line_number + rows.line_num - 1, 1, TOO_FEW_COLUMNS)
+    if not reader.bad_rows or reader.bad_rows[-1] != range_end:
+        return None, None, False
+    reader.bad_rows.pop()
+    return reader.table, reader.bad_rows, True
@@ -1,29 +1,156 @@
 import csv
+import os
+import shutil
+import time
+from multiprocessing import Pool
+from .metrics import Progress
 
 def write_graph_to_csv(path, graph):
 
-    file = open(path, mode='w')
+    file = open(path, mode='w', newline='')
     writer = csv.writer(file)
 
     # Write Rows
     size = graph.get_size()
+    references = graph.get_references()
+    progress = Progress("Writing row", size)
+    num_lines = 0
     for i in range(size - 1):
         if i % 100 == 0:
-            print("\tWriting row {} of {}".format(i, size))
-        for j in range(i + 1, size):
-            value = graph.get_value(i, j)
-            if value > 0:
-                ref1 = graph.get_reference(i)
-                ref2 = graph.get_reference(j)
-                row_to_write = [ref1, ref2]
-                for _ in range(value):
-                    writer.writerow(row_to_write)
+            progress.update(i, lines=num_lines)
+        ref1 = references[i]
+        for j, value in graph.get_row(i):
+            writer.writerows([(ref1, references[j])] * value)
+            num_lines += value
     file.close()
+    return num_lines
+
+
+def write_graph_to_csv_sharded(path, graph, workers, keep_parts=False):
+    """Write the edge list of a graph using a pool of worker processes.
+
+    The rows of the graph are split into one contiguous range per worker, balanced by the
+    number of links to be walked. Each worker writes its range to its own part-*.csv file in
+    a directory next to path. The parts are then concatenated in row order into path, giving
+    the same file as write_graph_to_csv, unless keep_parts is set, in which case the parts are
+    left in place.
+
+    :param path: Path of the edge list to write
+    :param graph: Graph to write
+    :param workers: Number of worker processes
+    :param keep_parts: Leave the part-*.csv files instead of concatenating them
+    :return: A list of (start row, stop row, rows written, seconds) for each shard
+    """
+    parts_directory = os.path.splitext(path)[0] + "_parts"
+    os.makedirs(parts_directory, exist_ok=True)
+
+    projection = graph.get_projection()
+    partition = projection.get_partition(workers)
+    tasks = []
+    for k, (start, stop) in enumerate(partition):
+        part_path = os.path.join(parts_directory, "part-{:05d}.csv".format(k))
+        tasks.append((part_path, start, stop))
+
+    with Pool(workers, initializer=_init_shard_worker, initargs=(projection, graph.get_references())) as pool:
+        results = pool.map(_write_shard, tasks)
+
+    shards = []
+    for (part_path, start, stop), (num_rows, seconds) in zip(tasks, results):
+        print("\tShard {}: rows {} to {}, {} lines written in {:.2f}s".format(
+            os.path.basename(part_path), start, stop, num_rows, seconds))
+        shards.append((start, stop, num_rows, seconds))
+
+    if not keep_parts:
+        with open(path, mode='wb') as file:
+            for part_path, _, _ in tasks:
+                with open(part_path, mode='rb') as part:
+                    shutil.copyfileobj(part, file)
+        shutil.rmtree(parts_directory)
+    return shards
+
+
+_shard_projection = None
+_shard_references = None
+
+def _init_shard_worker(projection, references):
+    global _shard_projection, _shard_references
+    _shard_projection = projection
+    _shard_references = references
+
+def _write_shard(task):
+    part_path, start, stop = task
+    start_time = time.perf_counter()
+    num_rows = 0
+    file = open(part_path, mode='w', newline='')
+    writer = csv.writer(file)
+    for i, j, value in _shard_projection.get_edges(start, stop):
+        writer.writerows([(_shard_references[i], _shard_references[j])] * value)
+        num_rows += value
+    file.close()
+    return num_rows, time.perf_counter() - start_time
+
+
+def write_weighted_graph_to_csv(path, graph):
+    """Write one src,dst,weight line per linked pair, instead of repeating [src, dst] weight times."""
+    file = open(path, mode='w', newline='')
+    writer = csv.writer(file)
+    writer.writerow(["src", "dst", "weight"])
+    references = graph.get_references()
+    num_lines = 0
+    for i, j, value in graph.get_edges():
+        writer.writerow([references[i], references[j], value])
+        num_lines += 1
+    file.close()
+    return num_lines
+
+
+def write_graph_nodes_to_csv(path, graph):
+    """Write the node table id,name mapping the integer IDs of an ID edge list to references."""
+    file = open(path, mode='w', newline='')
+    writer = csv.writer(file)
+    writer.writerow(["id", "name"])
+    for i, reference in enumerate(graph.get_references()):
+        writer.writerow([i, reference])
+    file.close()
+
+
+def write_id_graph_to_csv(path, graph):
+    """Write one src,dst,weight line per linked pair, using the integer IDs of the node table."""
+    file = open(path, mode='w', newline='')
+    writer = csv.writer(file)
+    writer.writerow(["src", "dst", "weight"])
+    num_lines = 0
+    for edge in graph.get_edges():
+        writer.writerow(edge)
+        num_lines += 1
+    file.close()
+    return num_lines
+
+
+def write_incidence_to_csv(path, directors):
+    """Write one director,firm,entries line per firm of each director, with the number of entries of the director
+    at the firm, using the integer IDs of the director and firm node tables.
+
+    :return: The number of lines written
+    """
+    file = open(path, mode='w', newline='')
+    writer = csv.writer(file)
+    writer.writerow(["director", "firm", "entries"])
+    num_lines = 0
+    for i, d in enumerate(directors):
+        counts = {}
+        for e in d.entries:
+            firm_index = e.firm_index
+            counts[firm_index] = counts.get(firm_index, 0) + 1
+        writer.writerows((i, firm_index, count) for firm_index, count in sorted(counts.items()))
+        num_lines += len(counts)
+    file.close()
+    return num_lines
 
 
 def write_aliases_to_csv(path, directors):
     count_map = {}
-    file = open(path, mode='w')
+    file = open(path, mode='w', newline='')
     writer = csv.writer(file)
     for d in directors:
         aliases = d.get_aliases()
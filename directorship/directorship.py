@@ -1,39 +1,146 @@
 import os
 import sys
 import argparse
+import contextlib
+import cProfile
+import csv
+import fnmatch
+import pstats
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 from .classes.graph import Graph
 from .classes.director import Director
-from .csv_reader import read_csv
-from .csv_writer import write_graph_to_csv, write_aliases_to_csv
-from .entry_handler import get_directors
-from .log_writer import LogWriter
+from .classes.resolution_state import ResolutionState
+from .columnar_reader import get_input_format, import_pyarrow, open_input, parse_input
+from .csv_reader import DEFAULT_CHUNK_SIZE, get_bad_rows_message
+from .csv_writer import write_graph_to_csv, write_graph_to_csv_sharded, write_weighted_graph_to_csv, \
+    write_graph_nodes_to_csv, write_id_graph_to_csv, write_aliases_to_csv, write_incidence_to_csv
+from .ingest_cache import read_input_with_cache
+from .entry_handler import get_directors, update_directors
+from .log_renderer import render_logs
+from .log_writer import LogWriter, ProvenanceLogWriter, LOG_LEVELS, LOG_LEVEL_FULL
+from .metrics import Metrics, NullMetrics, get_metrics, set_metrics, get_peak_memory_mb
+from .year_linker import load_directors, get_panel_ids, write_panel_to_csv
+from .graph_analysis import DEFAULT_TOP, import_scipy, load_run, analyze_run, write_analysis
+from .out_of_core import DEFAULT_RUN_SIZE, sort_rows, resolve_sorted_rows, write_director_records
+from .npz_writer import write_graph_to_npz, import_numpy
+from .sqlite_store import write_sqlite
+
+EDGE_FORMATS = ['csv', 'weighted', 'ids', 'npz']
+LOG_FORMATS = ['text', 'jsonl']
 
 def parse_args(args):
     parser = argparse.ArgumentParser()
-    parser.add_argument('input', help='input csv file located in data/input/')
+    parser.add_argument('input', help='input csv, Parquet (.parquet) or Feather (.feather) file located in data/input/')
     parser.add_argument('output', help='name of output directory to create or overwrite in data/output/')
+    add_run_arguments(parser)
+    parser.add_argument('--incremental', action='store_true',
+                        help='add the rows of input to those of the previous run into output, processing only the '
+                             'names they share a first initial, last name and suffix with')
+    parser.add_argument('--metrics', type=str, default=None,
+                        help='path of a JSON file to write the time and memory of each stage of the run to, along '
+                             'with block sizes and counts of comparisons and edges')
+    parser.add_argument('--profile', action='store_true',
+                        help='profile the run with cProfile, writing profile.pstats to the output directory')
+    parser.add_argument('--sqlite', type=str, default=None,
+                        help='path of an indexed SQLite database to write the entries, directors, aliases, firm '
+                             'memberships and, with --log-format jsonl, merge events of the run to')
+    parser.add_argument('--sqlite-edges', action='store_true',
+                        help='also write the weighted firm and director edge lists to the --sqlite database')
+    return parser.parse_args(args)
+
+def add_run_arguments(parser):
+    parser.add_argument('-y', '--yes', action='store_true',
+                        help='overwrite output directories without asking for confirmation')
     parser.add_argument('-f', action='store_true', help='write firm edge list')
     parser.add_argument('-d', action='store_true', help='write director edge list')
     parser.add_argument('-a', action='store_true', help='write aliases')
+    parser.add_argument('-b', action='store_true',
+                        help='write the director-firm incidence, with director and firm node tables')
     parser.add_argument('--indir', type=str, default='data/input')
     parser.add_argument('--outdir', type=str, default='data/output')
-    return parser.parse_args(args)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='number of rows read from the input csv at a time')
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default=LOG_LEVEL_FULL,
+                        help='full: write the lists of directors to the logs; counts: write only the count of each '
+                             'list; none: write no logs')
+    parser.add_argument('--log-format', choices=LOG_FORMATS, default='text',
+                        help='text: one text file per list; jsonl: a single provenance.jsonl with one record per '
+                             'director, from which the text files can be written by "logs render"')
+    parser.add_argument('--jobs', type=int, default=1, help='number of processes resolving directors')
+    parser.add_argument('--edge-format', choices=EDGE_FORMATS, default='csv',
+                        help='csv: one [src, dst] line per shared link; weighted: one src,dst,weight line per pair; '
+                             'ids: node table and integer src,dst,weight edge list; '
+                             'npz: node table and sparse adjacency matrix (requires numpy)')
+    parser.add_argument('--cache', action='store_true',
+                        help='read the columns of the input from the ingest cache in the output directory, written '
+                             'by a previous run with --cache on the same input, or write the cache if there is none')
+    parser.add_argument('--save-state', action='store_true',
+                        help='save the entries and directors of the run to state.pickle in the output directory, '
+                             'for --incremental, link-years and analyze; implied by --incremental')
+    parser.add_argument('--out-of-core', action='store_true',
+                        help='resolve inputs too large for memory by sorting their rows by first initial, last name '
+                             'and suffix on disk, and resolving a few names at a time; writes -b and -a outputs only')
+    parser.add_argument('--run-size', type=int, default=DEFAULT_RUN_SIZE,
+                        help='number of rows sorted in memory at a time by --out-of-core')
+    parser.add_argument('--read-workers', type=int, default=1,
+                        help='number of processes parsing the input, when it is not read from the ingest cache '
+                             'or added to a previous run')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes writing each edge list')
+    parser.add_argument('--keep-parts', action='store_true',
+                        help='with --workers, leave edge lists as part-*.csv files instead of concatenating them')
 
 def main(args):
+    """Run args, recording the metrics of the run if args.metrics is set, and profiling it if args.profile is."""
+    metrics = None
+    if args.metrics is not None:
+        metrics = Metrics()
+        set_metrics(metrics)
+    try:
+        if args.profile:
+            profiler = cProfile.Profile()
+            try:
+                result = profiler.runcall(run, args)
+            finally:
+                profile_path = f"{args.outdir}/{args.output}/profile.pstats"
+                profiler.dump_stats(profile_path)
+                print("* Profile written to '{}'. Top functions by cumulative time:".format(profile_path))
+                pstats.Stats(profiler).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(20)
+        else:
+            result = run(args)
+        if metrics is not None:
+            for name, value in result.items():
+                metrics.add(name, value)
+            metrics.write(args.metrics)
+            print("Metrics written to '{}'".format(args.metrics))
+        return result
+    finally:
+        set_metrics(NullMetrics())
+
+def run(args):
     # parse arguments from the command line
-    input_file = args.input  # csv in data directory to be read
+    input_file = args.input  # csv, Parquet or Feather file in data directory to be read
     output_directory_name = args.output  # name of output directory to be created
     write_firms_edge_list = args.f  # write firms edge list or not
     write_directors_edge_list = args.d  # write directors edge list or not
     write_aliases = args.a  # write director aliases
+    write_incidence = args.b  # write director-firm incidence
+    edge_format = args.edge_format  # format of the edge lists
+    workers = args.workers  # number of processes writing each edge list
 
     input_path = f"{args.indir}/{input_file}"
     output_directory = f"{args.outdir}/{output_directory_name}/"
 
     output_log_directory = output_directory + "logs/"
-    output_firms_edge_list_path = output_directory + "firms_edge_list.csv"
-    output_directors_edge_list_path = output_directory + "directors_edge_list.csv"
+    output_firms_edge_list_prefix = output_directory + "firms"
+    output_directors_edge_list_prefix = output_directory + "directors"
     output_aliases_list_path = output_directory + "aliases.csv"
+    output_incidence_path = output_directory + "incidence.csv"
+    output_state_path = output_directory + "state.pickle"
+    output_cache_path = output_directory + "ingest_cache.bin"
+    output_bad_rows_path = output_directory + "bad_rows.csv"
 
     # check and correct directory structure
     os.makedirs(args.indir, exist_ok=True)
@@ -44,50 +151,449 @@ def main(args):
     if not os.path.isfile(input_path):
         sys.exit("Operation aborted. Input file '{}' does not exist.".format(input_path))
 
+    # check the previous run of an incremental run
+    state = None
+    if args.incremental:
+        if not os.path.isfile(output_state_path):
+            sys.exit("Operation aborted. No saved state found in '{}'. Run with --save-state first.".format(
+                output_directory))
+        try:
+            state = ResolutionState.load(output_state_path)
+        except ValueError as e:
+            sys.exit("Operation aborted. {}".format(e))
+        if input_path in state.inputs:
+            sys.exit("Operation aborted. The rows of '{}' were already added to '{}'.".format(
+                input_path, output_directory))
+
+    if args.sqlite_edges and args.sqlite is None:
+        sys.exit("Operation aborted. --sqlite-edges requires --sqlite.")
+
+    # check optional dependencies
+    if edge_format == 'npz' and (write_firms_edge_list or write_directors_edge_list):
+        try:
+            import_numpy()
+        except ImportError as e:
+            sys.exit("Operation aborted. {}".format(e))
+    if get_input_format(input_path) != "csv":
+        try:
+            import_pyarrow()
+        except ImportError as e:
+            sys.exit("Operation aborted. {}".format(e))
+
+    # check options supported by out-of-core runs
+    if args.out_of_core:
+        unsupported = [option for option, used in [("-f", write_firms_edge_list), ("-d", write_directors_edge_list),
+                                                   ("--incremental", args.incremental),
+                                                   ("--save-state", args.save_state),
+                                                   ("--log-format jsonl", args.log_format == 'jsonl'),
+                                                   ("--jobs", args.jobs > 1),
+                                                   ("--sqlite", args.sqlite is not None)] if used]
+        if unsupported:
+            sys.exit("Operation aborted. --out-of-core does not support {}. Include -b to write the director-firm "
+                     "incidence, from which the edge lists can be computed.".format(", ".join(unsupported)))
+
     # ask user to continue, warn about overwrite
-    user_continue = input("The directory {} will be overwritten. Continue? [yes/no] ".format(
-        output_directory)).lower()
-    if user_continue != "yes":
-        sys.exit("Operation aborted by user.")
+    if not args.yes:
+        user_continue = input("The directory {} will be overwritten. Continue? [yes/no] ".format(
+            output_directory)).lower()
+        if user_continue != "yes":
+            sys.exit("Operation aborted by user.")
 
     # initialize logs
     print("* Initializing logs")
-    log_writer = LogWriter(output_log_directory)
+    inputs = [input_path] if state is None else state.inputs + [input_path]
+    if args.log_format == 'jsonl':
+        log_writer = ProvenanceLogWriter(output_log_directory, args.log_level, inputs)
+    else:
+        log_writer = LogWriter(output_log_directory, args.log_level)
     log_writer.initialize_text_files()
     Director.set_log_writer(log_writer)
-
-    # read input csv
-    print("* Reading '{}'".format(input_path))
+    metrics = get_metrics()
+    # Write the logs up to a failure, rather than leaving them in the queue of the writer thread
     try:
-        entries, firm_map = read_csv(input_path)
-    except IndexError as e:
-        sys.exit("Error reading file {}: {}".format(input_path, e))
+        if args.out_of_core:
+            return run_out_of_core(args, input_path, output_directory, log_writer)
 
-    # build director and firm lists
-    print("* Constructing Directors and Firms")
-    directors = get_directors(entries, firm_map, log_writer)
-    firms = list(firm_map.values())
+        # read input csv and build director and firm lists
+        print("* Reading '{}' and constructing Directors and Firms".format(input_path))
+        num_previous_rows = 0
+        if state is not None:
+            num_previous_rows = len(state.table)
+            with open_input(input_path, args.chunk_size, state.table, state.get_firm_map()) as reader:
+                directors = update_directors(state.blocks, reader.read_entries(), reader.firm_map, log_writer,
+                                             args.jobs)
+            firm_map = reader.firm_map
+            bad_rows = reader.bad_rows
+            state.inputs = inputs
+        else:
+            start_time = time.perf_counter()
+            with metrics.stage("read"):
+                if args.cache:
+                    table, bad_rows, from_cache = read_input_with_cache(input_path, output_cache_path,
+                                                                        args.read_workers)
+                    source = "from cache" if from_cache else "parsed, cache written to '{}'".format(output_cache_path)
+                else:
+                    table, bad_rows = parse_input(input_path, args.read_workers)
+                    source = "parsed"
+            print("\tRead {} rows in {:.2f} s ({})".format(len(table), time.perf_counter() - start_time, source))
+            blocks = {}
+            firm_map = table.get_firm_map()
+            directors = get_directors(iter(table), firm_map, log_writer, args.jobs, blocks)
+            state = ResolutionState(table, blocks, inputs)
+        firms = list(firm_map.values())
+        metrics.add("bad_rows", len(bad_rows))
+        if bad_rows:
+            if len(state.table) == num_previous_rows:
+                sys.exit("Error reading file {}: {}".format(input_path, get_bad_rows_message(bad_rows)))
+            print("\tSkipped {} rows with too few columns or an empty First or Middle Name. Their line numbers are "
+                  "written to '{}'".format(len(bad_rows), output_bad_rows_path))
+        write_bad_rows(output_bad_rows_path, input_path, bad_rows, append=args.incremental)
+        print_peak_memory()
 
-    # write counts to logs
-    log_writer.write_counts()
+        # save state for incremental runs, or remove that of a previous run, which no longer matches the outputs
+        if args.save_state or args.incremental:
+            with metrics.stage("state"):
+                state.save(output_state_path)
+        elif os.path.isfile(output_state_path):
+            os.remove(output_state_path)
+
+        # write counts to logs
+        with metrics.stage("log"):
+            log_writer.write_counts()
+            log_writer.close()
+    except BaseException:
+        log_writer.close()
+        raise
+    for path, list_number in log_writer.LISTS.items():
+        metrics.add("log." + os.path.splitext(os.path.basename(path))[0], log_writer.COUNTS[list_number])
 
     # write firm edge list
+    firm_graph = None
+    directors_graph = None
     if write_firms_edge_list:
-        print("* Writing Firm Edge List to '{}'".format(output_firms_edge_list_path))
-        firm_graph = Graph(firms)
-        write_graph_to_csv(output_firms_edge_list_path, firm_graph)
+        print("* Writing Firm Edge List to '{}*'".format(output_firms_edge_list_prefix))
+        with metrics.stage("firm graph"):
+            firm_graph = Graph(firms)
+            num_edges = write_edge_list(output_firms_edge_list_prefix, firm_graph, edge_format, workers,
+                                        args.keep_parts)
+        metrics.add("firm_edges_written", num_edges)
 
     # write director edge list
     if write_directors_edge_list:
-        print("* Writing Director Edge List to '{}'".format(output_directors_edge_list_path))
-        directors_graph = Graph(directors)
-        write_graph_to_csv(output_directors_edge_list_path, directors_graph)
+        print("* Writing Director Edge List to '{}*'".format(output_directors_edge_list_prefix))
+        with metrics.stage("director graph"):
+            directors_graph = Graph(directors)
+            num_edges = write_edge_list(output_directors_edge_list_prefix, directors_graph, edge_format, workers,
+                                        args.keep_parts)
+        metrics.add("director_edges_written", num_edges)
+
+    if write_incidence:
+        print("* Writing director-firm incidence to '{}'".format(output_incidence_path))
+        with metrics.stage("incidence"):
+            write_graph_nodes_to_csv(output_firms_edge_list_prefix + "_nodes.csv", Graph(firms))
+            write_graph_nodes_to_csv(output_directors_edge_list_prefix + "_nodes.csv", Graph(directors))
+            num_lines = write_incidence_to_csv(output_incidence_path, directors)
+        metrics.add("incidence_lines_written", num_lines)
 
     if write_aliases:
         print("* Writing aliases to '{}' ".format(output_aliases_list_path))
-        write_aliases_to_csv(output_aliases_list_path, directors)
+        with metrics.stage("aliases"):
+            write_aliases_to_csv(output_aliases_list_path, directors)
+
+    if args.sqlite is not None:
+        print("* Writing SQLite database to '{}'".format(args.sqlite))
+        records = None
+        if args.log_format == 'jsonl' and args.log_level == LOG_LEVEL_FULL:
+            records = log_writer.get_records()
+        else:
+            print("\tMerge events are only written with --log-format jsonl and --log-level full")
+        with metrics.stage("sqlite"):
+            if args.sqlite_edges:
+                firm_graph = Graph(firms) if firm_graph is None else firm_graph
+                directors_graph = Graph(directors) if directors_graph is None else directors_graph
+            counts = write_sqlite(args.sqlite, state.table, firms, directors,
+                                  [os.path.splitext(os.path.basename(path))[0] for path in log_writer.LISTS],
+                                  log_writer.COUNTS, records, firm_graph if args.sqlite_edges else None,
+                                  directors_graph if args.sqlite_edges else None)
+        for name, count in counts.items():
+            metrics.add("sqlite." + name, count)
 
     print("Success. Logs written to '{}'".format(output_log_directory))
+    return {"rows": len(state.table), "firms": len(firms), "directors": len(directors)}
+
+def run_out_of_core(args, input_path, output_directory, log_writer):
+    """Resolve the directors of input_path with out_of_core, writing the -b and -a outputs of args in the order of
+    a run holding all rows in memory."""
+    output_log_directory = output_directory + "logs/"
+    output_bad_rows_path = output_directory + "bad_rows.csv"
+    metrics = get_metrics()
+
+    with tempfile.TemporaryDirectory(dir=output_directory) as temporary_directory:
+        print("* Sorting the rows of '{}' by first initial, last name and suffix".format(input_path))
+        with metrics.stage("read"):
+            row_sorter, firm_map, bad_rows = sort_rows(input_path, temporary_directory, args.run_size)
+        num_rows = len(row_sorter)
+        metrics.add("bad_rows", len(bad_rows))
+        if bad_rows:
+            if num_rows == 0:
+                sys.exit("Error reading file {}: {}".format(input_path, get_bad_rows_message(bad_rows)))
+            print("\tSkipped {} rows with too few columns or an empty First or Middle Name. Their line numbers "
+                  "are written to '{}'".format(len(bad_rows), output_bad_rows_path))
+        write_bad_rows(output_bad_rows_path, input_path, bad_rows)
+
+        print("* Constructing Directors")
+        director_sorter = resolve_sorted_rows(row_sorter, firm_map, log_writer, temporary_directory, args.run_size,
+                                              args.chunk_size)
+        print_peak_memory()
+
+        print("* Writing Directors in order")
+        with metrics.stage("write directors"):
+            if args.b:
+                write_graph_nodes_to_csv(output_directory + "firms_nodes.csv", Graph(list(firm_map.values())))
+            num_directors, num_lines = write_director_records(
+                director_sorter, log_writer,
+                nodes_path=output_directory + "directors_nodes.csv" if args.b else None,
+                incidence_path=output_directory + "incidence.csv" if args.b else None,
+                aliases_path=output_directory + "aliases.csv" if args.a else None)
+        if args.b:
+            metrics.add("incidence_lines_written", num_lines)
+
+    with metrics.stage("log"):
+        log_writer.write_counts()
+        log_writer.close()
+    for path, list_number in log_writer.LISTS.items():
+        metrics.add("log." + os.path.splitext(os.path.basename(path))[0], log_writer.COUNTS[list_number])
+
+    # The state of a previous run no longer matches the outputs
+    if os.path.isfile(output_directory + "state.pickle"):
+        os.remove(output_directory + "state.pickle")
+
+    print("Success. Logs written to '{}'".format(output_log_directory))
+    return {"rows": num_rows, "firms": len(firm_map), "directors": num_directors}
+
+def parse_batch_args(args):
+    parser = argparse.ArgumentParser(prog='directorship batch',
+                                     description='run every input csv in --indir, each into the output directory '
+                                                 'named after it in --outdir, e.g. 1920_data.csv into 1920')
+    add_run_arguments(parser)
+    parser.add_argument('--pattern', type=str, default='*.csv',
+                        help="pattern of the input files to run, e.g. '*.parquet'")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help='number of inputs run at the same time, each in its own process')
+    return parser.parse_args(args)
+
+def get_batch_output_name(input_file):
+    name = os.path.splitext(input_file)[0]
+    if name.endswith("_data"):
+        name = name[:-len("_data")]
+    return name
+
+def batch_main(args):
+    input_files = sorted(f for f in os.listdir(args.indir)
+                         if fnmatch.fnmatch(f, args.pattern) and os.path.isfile(os.path.join(args.indir, f)))
+    if not input_files:
+        sys.exit("Operation aborted. No input files matching '{}' in '{}'.".format(args.pattern, args.indir))
+    output_names = [get_batch_output_name(f) for f in input_files]
+    if len(set(output_names)) < len(output_names):
+        sys.exit("Operation aborted. Input files {} would share output directories.".format(", ".join(input_files)))
+
+    # ask user to continue once for all inputs, warn about overwrite
+    if not args.yes:
+        print("Inputs to run: {}".format(", ".join(input_files)))
+        user_continue = input("The directories {} in {} will be overwritten. Continue? [yes/no] ".format(
+            ", ".join(output_names), args.outdir)).lower()
+        if user_continue != "yes":
+            sys.exit("Operation aborted by user.")
+
+    print("* Running {} inputs with {} processes".format(len(input_files), args.processes))
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(args.processes) as executor:
+        futures = [executor.submit(run_batch_input, args, input_file, output_name)
+                   for input_file, output_name in zip(input_files, output_names)]
+        results = []
+        for future in futures:
+            result = future.result()
+            print("\t{input}: {status} in {seconds:.1f} s".format(**result))
+            results.append(result)
+
+    summary_path = os.path.join(args.outdir, "batch_summary.csv")
+    write_batch_summary(summary_path, results)
+    print("Finished in {:.1f} s. Summary written to '{}'".format(time.perf_counter() - start_time, summary_path))
+    if any(result["status"] != "ok" for result in results):
+        sys.exit("Some inputs failed. See run.log in their output directories.")
+
+def run_batch_input(args, input_file, output_name):
+    """Run main on one input of a batch, writing its output to run.log in its output directory."""
+    run_args = argparse.Namespace(**vars(args))
+    run_args.input = input_file
+    run_args.output = output_name
+    run_args.incremental = False
+    run_args.metrics = None
+    run_args.profile = False
+    run_args.sqlite = None
+    run_args.sqlite_edges = False
+    run_args.yes = True
+    output_directory = f"{args.outdir}/{output_name}/"
+    os.makedirs(output_directory, exist_ok=True)
+    result = {"input": input_file, "output": output_name, "status": "ok", "rows": "", "firms": "",
+              "directors": ""}
+    start_time = time.perf_counter()
+    with open(output_directory + "run.log", 'w') as log_file, contextlib.redirect_stdout(log_file):
+        try:
+            result.update(main(run_args))
+        except SystemExit as e:
+            print(e)
+            result["status"] = "failed: {}".format(str(e).splitlines()[0])
+        except Exception as e:
+            traceback.print_exc(file=log_file)
+            result["status"] = "failed: {!r}".format(e)
+    result["seconds"] = time.perf_counter() - start_time
+    return result
+
+def write_batch_summary(path, results):
+    with open(path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["input", "output", "status", "rows", "firms", "directors", "seconds"])
+        for result in results:
+            writer.writerow([result["input"], result["output"], result["status"], result["rows"],
+                             result["firms"], result["directors"], "{:.2f}".format(result["seconds"])])
+
+def parse_logs_args(args):
+    parser = argparse.ArgumentParser(prog='directorship logs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    render_parser = subparsers.add_parser('render', help='write the text lists of a provenance.jsonl log')
+    render_parser.add_argument('output', help='name of the output directory of the run in data/output/')
+    render_parser.add_argument('--outdir', type=str, default='data/output')
+    render_parser.add_argument('--input', dest='inputs', action='append', default=None,
+                               help='input csv of the run, if moved since the run (repeatable, in order, for '
+                                    'incremental runs)')
+    render_parser.add_argument('--list', dest='lists', action='append', default=None,
+                               help='name of a list to write, e.g. "truly ambiguous" (repeatable, default all)')
+    return parser.parse_args(args)
+
+def logs_main(args):
+    output_log_directory = f"{args.outdir}/{args.output}/logs/"
+    provenance_path = output_log_directory + "provenance.jsonl"
+    if not os.path.isfile(provenance_path):
+        sys.exit("Operation aborted. Provenance log '{}' does not exist.".format(provenance_path))
+    try:
+        paths = render_logs(provenance_path, output_log_directory, args.inputs, args.lists)
+    except (ValueError, IndexError, OSError) as e:
+        sys.exit("Error rendering logs: {}".format(e))
+    print("Success. {} logs written to '{}'".format(len(paths), output_log_directory))
+
+def parse_link_years_args(args):
+    parser = argparse.ArgumentParser(prog='directorship link-years',
+                                     description='link the directors of runs of consecutive years by name, '
+                                                 'and write a table of panel ids')
+    parser.add_argument('outputs', nargs='+', help='names of the output directories of the runs in data/output/, '
+                                                   'in order of year')
+    parser.add_argument('--outdir', type=str, default='data/output')
+    parser.add_argument('--panel', type=str, default='panel.csv',
+                        help='name of the panel id table to write in data/output/')
+    return parser.parse_args(args)
+
+def link_years_main(args):
+    if len(args.outputs) < 2:
+        sys.exit("Operation aborted. At least two runs are needed to link.")
+    years_directors = []
+    for output in args.outputs:
+        output_directory = f"{args.outdir}/{output}/"
+        if not os.path.isfile(output_directory + "state.pickle"):
+            sys.exit("Operation aborted. No saved state found in '{}'. Run with --save-state first.".format(
+                output_directory))
+        print("* Loading directors of '{}'".format(output_directory))
+        try:
+            years_directors.append(load_directors(output_directory))
+        except ValueError as e:
+            sys.exit("Operation aborted. {}".format(e))
+
+    print("* Linking directors")
+    panel_ids, link_counts = get_panel_ids(years_directors)
+    for year, next_year, (num_links, num_ambiguous) in zip(args.outputs, args.outputs[1:], link_counts):
+        print("\t{} -> {}: {} directors linked, {} left unlinked as ambiguous".format(
+            year, next_year, num_links, num_ambiguous))
+    panel_path = f"{args.outdir}/{args.panel}"
+    write_panel_to_csv(panel_path, args.outputs, years_directors, panel_ids)
+    print("Success. {} panel ids written to '{}'".format(max(max(ids, default=-1) for ids in panel_ids) + 1,
+                                                          panel_path))
+
+def parse_analyze_args(args):
+    parser = argparse.ArgumentParser(prog='directorship analyze',
+                                     description='compute the degree distributions, connected components and most '
+                                                 'interlocked nodes of the firm and director graphs of a run')
+    parser.add_argument('output', help='name of the output directory of the run in data/output/')
+    parser.add_argument('--outdir', type=str, default='data/output')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP,
+                        help='number of most interlocked firms and directors to list')
+    return parser.parse_args(args)
+
+def analyze_main(args):
+    output_directory = f"{args.outdir}/{args.output}/"
+    output_analysis_directory = output_directory + "analysis/"
+    if not os.path.isfile(output_directory + "state.pickle"):
+        sys.exit("Operation aborted. No saved state found in '{}'. Run with --save-state first.".format(
+            output_directory))
+    try:
+        import_scipy()
+    except ImportError as e:
+        sys.exit("Operation aborted. {}".format(e))
+
+    print("* Loading directors and firms of '{}'".format(output_directory))
+    try:
+        directors, firms = load_run(output_directory)
+    except ValueError as e:
+        sys.exit("Operation aborted. {}".format(e))
+
+    print("* Analyzing graphs")
+    start_time = time.perf_counter()
+    results = analyze_run(directors, firms, args.top)
+    for name, stats in results.items():
+        print("\t{}: {nodes} nodes, {edges} edges ({edge_list_lines} edge list lines), {components} components, "
+              "largest with {largest_component_nodes} nodes, max degree {max_degree}".format(name, **stats))
+    print("\tAnalyzed in {:.2f} s".format(time.perf_counter() - start_time))
+    write_analysis(output_analysis_directory, results)
+    print("Success. Analysis written to '{}'".format(output_analysis_directory))
+
+def write_bad_rows(path, input_path, bad_rows, append=False):
+    """Write the rows of input_path skipped when reading it, or remove the file if there are none and it is not
+    appended to."""
+    if not bad_rows:
+        if not append and os.path.isfile(path):
+            os.remove(path)
+        return
+    write_header = not (append and os.path.isfile(path))
+    with open(path, mode='a' if append else 'w', newline='') as file:
+        writer = csv.writer(file)
+        if write_header:
+            writer.writerow(["input", "line", "columns", "reason"])
+        writer.writerows((input_path, line_number, num_columns, reason)
+                         for line_number, num_columns, reason in bad_rows)
+
+def print_peak_memory():
+    peak = get_peak_memory_mb()
+    if peak is not None:
+        print("\tPeak memory: {:.1f} MB".format(peak))
+
+def write_edge_list(prefix, graph, edge_format, workers, keep_parts):
+    """Write the edges of graph in edge_format to files starting with prefix, and return the number written."""
+    if edge_format == 'weighted':
+        return write_weighted_graph_to_csv(prefix + "_weighted_edge_list.csv", graph)
+    elif edge_format == 'ids':
+        write_graph_nodes_to_csv(prefix + "_nodes.csv", graph)
+        return write_id_graph_to_csv(prefix + "_id_edge_list.csv", graph)
+    elif edge_format == 'npz':
+        write_graph_nodes_to_csv(prefix + "_nodes.csv", graph)
+        return write_graph_to_npz(prefix + "_adjacency.npz", graph)
+    elif workers > 1:
+        start_time = time.perf_counter()
+        shards = write_graph_to_csv_sharded(prefix + "_edge_list.csv", graph, workers, keep_parts)
+        num_lines = sum(s[2] for s in shards)
+        print("\t{} lines written by {} workers in {:.2f}s".format(
+            num_lines, workers, time.perf_counter() - start_time))
+        return num_lines
+    else:
+        return write_graph_to_csv(prefix + "_edge_list.csv", graph)
 
 
 if __name__ == "__main__":
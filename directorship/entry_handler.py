@@ -1,6 +1,13 @@
+import multiprocessing
 from .classes.director import Director
+from .classes.union_find import UnionFind
+from . import name_kernel
+from .metrics import Metrics, get_metrics, set_metrics
 
-def get_directors(entries, firm_map, log_writer):
+# Number of name variants above which the name relation is evaluated by name_kernel, if numpy is installed
+VECTORIZED_COMPARISON_THRESHOLD = 64
+
+def get_directors(entries, firm_map, log_writer, jobs=1, blocks=None):
     """Process entries and return list of directors.
 
     Entries are clustered into sets sharing a common
@@ -11,50 +18,212 @@ def get_directors(entries, firm_map, log_writer):
     returned. In the case of a non-singleton set, the set is processed by function
     get_directors_from_non_singleton_set, and the resulting list is merged with the list to return.
 
+    Once all directors are constructed, they are given dense indices in the order of the returned list,
+    and each firm records the indices of its directors.
+
+    Entries are consumed in a single pass, so they may be streamed from a CsvReader, in which case
+    firm_map is filled in by the reader as the entries are read.
+
+    If jobs > 1, the non-singleton sets are processed by get_directors_from_non_singleton_sets_in_parallel,
+    with the same result and logs as when processed in order.
+
     :param log_writer: log_writer
-    :param entries: A list of entries
+    :param entries: An iterable of entries
     :param firm_map: Mapping from firm_id to Firm object
+    :param jobs: Number of processes used to process the non-singleton sets
+    :param blocks: If given, a dict filled with the directors of each set, keyed by (first_init, last, suffix)
+        in order of first appearance, from which update_directors can resolve entries added later
     :return: A list of Directors
     """
-    # Construct a mapping from (first_init, last, suffix) to set of satisfying entries
+    with get_metrics().stage("block"):
+        entry_sets = get_entry_sets(entries)
+    resolved_blocks = get_directors_from_entry_sets(entry_sets, firm_map, log_writer, jobs)
+    if blocks is not None:
+        blocks.update(resolved_blocks)
+    return get_all_directors(resolved_blocks, firm_map, log_writer)
+
+
+def update_directors(blocks, entries, firm_map, log_writer, jobs=1):
+    """Process entries added to those of a previous run, and return list of all directors.
+
+    Only the sets of entries sharing a common First Initial, Last Name, and Jr Status with one of the new
+    entries are processed again, from their previous entries and the new ones, so the time taken depends on
+    the new entries rather than all of them. The result is the same as that of get_directors on all the
+    entries, provided the new entries come after the previous ones in the EntryTable. The logs list only the
+    directors of the sets processed again, and the list of all directors.
+
+    :param blocks: The directors of each set of the previous run, as filled in by get_directors, which are
+        updated in place
+    :param entries: An iterable of the new entries
+    :param firm_map: Mapping from firm_id to Firm object, for all entries, in which no firm records directors yet
+    :param log_writer: log writer
+    :param jobs: Number of processes used to process the non-singleton sets
+    :return: A list of Directors
+    """
+    with get_metrics().stage("block"):
+        entry_sets = get_entry_sets(entries)
+    for k in entry_sets:
+        if k in blocks:
+            # Rebuild the set by adding all its entries in order, as get_entry_sets would have
+            previous_entries = [e for d in blocks[k] for e in d.entries]
+            entry_set = set()
+            for e in sorted(previous_entries + list(entry_sets[k]), key=lambda e: e.index):
+                entry_set.add(e)
+            entry_sets[k] = entry_set
+    blocks.update(get_directors_from_entry_sets(entry_sets, firm_map, log_writer, jobs))
+    return get_all_directors(blocks, firm_map, log_writer)
+
+
+def get_entry_sets(entries):
+    """Return a mapping from (first_init, last, suffix) to the set of entries with those values, in order of
+    first appearance."""
     mapping = {}
     for e in entries:
         k = (e.first_init, e.last, e.suffix)
         if k not in mapping:
             mapping[k] = set()
         mapping[k].add(e)
+    return mapping
+
+
+def get_directors_from_entry_sets(entry_sets, firm_map, log_writer, jobs=1):
+    """Process the sets of entries of get_entry_sets, and return a mapping from their keys to their directors."""
+    with get_metrics().stage("resolve"):
+        return _get_directors_from_entry_sets(entry_sets, firm_map, log_writer, jobs)
 
+def _get_directors_from_entry_sets(entry_sets, firm_map, log_writer, jobs):
+    metrics = get_metrics()
     # Partition the sets into those that are singletons and those that aren't
     singleton_sets = {}
     non_singleton_sets = {}
-    for k in mapping:
-        entry_set = mapping[k]
+    for k in entry_sets:
+        entry_set = entry_sets[k]
+        metrics.add("blocks")
+        metrics.observe("block_size", len(entry_set))
         if len(entry_set) == 1:
-            singleton_sets[k] = mapping[k]
+            singleton_sets[k] = entry_sets[k]
         else:
-            non_singleton_sets[k] = mapping[k]
+            non_singleton_sets[k] = entry_sets[k]
 
     # Singleton sets contain a definable director
+    blocks = {}
     directors_from_singleton_sets = []
-    for singleton_set in singleton_sets.values():
+    for k, singleton_set in singleton_sets.items():
         entry = singleton_set.pop()
         new_director = create_director_from_entry(entry, firm_map)
         directors_from_singleton_sets.append(new_director)
+        blocks[k] = [new_director]
 
     # Non-singleton sets must be processed differently
     directors_from_non_singleton_sets = []
-    for k in non_singleton_sets:
-        s = non_singleton_sets[k]
-        directors_from_non_singleton_sets += get_directors_from_non_singleton_set(s, firm_map, log_writer)
+    if jobs > 1 and len(non_singleton_sets) > 1:
+        set_directors = get_directors_from_non_singleton_sets_in_parallel(
+            list(non_singleton_sets.values()), firm_map, log_writer, jobs)
+        for k, directors in zip(non_singleton_sets, set_directors):
+            directors_from_non_singleton_sets += directors
+            blocks[k] = directors
+    else:
+        for k in non_singleton_sets:
+            s = non_singleton_sets[k]
+            directors = get_directors_from_non_singleton_set(s, firm_map, log_writer)
+            directors_from_non_singleton_sets += directors
+            blocks[k] = directors
 
     log_writer.write_directors_to_file(log_writer.LIST_SINGLETONS, directors_from_singleton_sets)
     log_writer.write_directors_to_file(log_writer.LIST_NON_SINGLETONS, directors_from_non_singleton_sets)
+    # Keep the keys in order of first appearance
+    return {k: blocks[k] for k in entry_sets}
+
+
+def get_all_directors(blocks, firm_map, log_writer):
+    """Return the sorted list of the directors of all blocks, and link them to their firms.
+
+    Directors of singleton sets come first, then those of non-singleton sets, each in the order of the blocks,
+    so that directors with equal names are in the same order as when all sets are processed at once.
+    """
+    directors_from_singleton_sets = []
+    directors_from_non_singleton_sets = []
+    for directors in blocks.values():
+        if len(directors) == 1 and len(directors[0].entries) == 1:
+            directors_from_singleton_sets += directors
+        else:
+            directors_from_non_singleton_sets += directors
     all_directors = directors_from_singleton_sets + directors_from_non_singleton_sets
-    all_directors.sort(key=lambda d: (d.last, d.first, d.middle, d.suffix))
+    with get_metrics().stage("link"):
+        all_directors.sort(key=lambda d: (d.last, d.first, d.middle, d.suffix))
+        link_directors_to_firms(all_directors, list(firm_map.values()))
     log_writer.write_directors_to_file(log_writer.LIST_ALL_DIRECTORS, all_directors)
     return all_directors
 
 
+def get_directors_from_non_singleton_sets_in_parallel(entry_sets, firm_map, log_writer, jobs):
+    """Process non-singleton sets of entries with a pool of worker processes.
+
+    Each worker processes a set with get_directors_from_non_singleton_set, using the recorder of
+    log_writer.create_recorder as log writer, and returns its directors and log records as plain data: the entry
+    indices, names and duplicate flag of each director, and the result of the recorder. The directors are then
+    reconstructed, and the log results written, in the order of entry_sets, so the result and logs are the same
+    as processing the sets in order.
+
+    Workers are forked where possible, so they share the table of entries, and the string hashing that orders
+    the aliases and addresses of the logs, with this process.
+
+    :param entry_sets: A list of non-singleton sets of entries, each sharing a common First Initial, Last Name,
+        and Jr Status.
+    :param firm_map: Mapping from firm_id to Firm object
+    :param log_writer: log writer
+    :param jobs: Number of worker processes
+    :return: A list with the list of Directors resulting from each set of entries, in the order of entry_sets.
+    """
+    table = next(iter(entry_sets[0])).table
+    # Sets are sent as sorted entry indices, and rebuilt by adding the entries in the same order in which
+    # the sets were built, so they iterate in the same order in the workers
+    tasks = [sorted(e.index for e in s) for s in entry_sets]
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+    chunk_size = max(1, len(tasks) // (jobs * 16))
+
+    set_directors = []
+    with context.Pool(jobs, initializer=_init_resolution_worker,
+                      initargs=(table, firm_map, log_writer.create_recorder())) as pool:
+        for director_records, log_result, metrics_data in pool.imap(_resolve_entry_set, tasks, chunk_size):
+            directors = [Director.from_record(record, table) for record in director_records]
+            log_writer.write_result(log_result, directors)
+            if metrics_data is not None:
+                get_metrics().merge(metrics_data)
+            set_directors.append(directors)
+    return set_directors
+
+
+_resolution_table = None
+_resolution_firm_map = None
+_resolution_log_recorder = None
+
+def _init_resolution_worker(table, firm_map, log_recorder):
+    global _resolution_table, _resolution_firm_map, _resolution_log_recorder
+    _resolution_table = table
+    _resolution_firm_map = firm_map
+    _resolution_log_recorder = log_recorder
+
+def _resolve_entry_set(entry_indices):
+    log_recorder = _resolution_log_recorder
+    log_recorder.clear()
+    Director.set_log_writer(log_recorder)
+    # Metrics inherited from the parent are replaced by fresh ones, whose data is returned to be merged
+    metrics = None
+    if isinstance(get_metrics(), Metrics):
+        metrics = Metrics()
+        set_metrics(metrics)
+    entries = set()
+    for i in entry_indices:
+        entries.add(_resolution_table[i])
+    directors = get_directors_from_non_singleton_set(entries, _resolution_firm_map, log_recorder)
+    director_records = [d.get_record() for d in directors]
+    return director_records, log_recorder.get_result(directors), None if metrics is None else metrics.get_data()
+
+
 def get_directors_from_non_singleton_set(entries, firm_map, log_writer):
     """Process a non-singleton set of entries sharing a common First Initial, Last Name, and Jr Status.
     
@@ -76,11 +245,15 @@ def get_directors_from_non_singleton_set(entries, firm_map, log_writer):
     # Write Directors to output text files
     log_writer.write_directors_to_file(log_writer.LIST_MIDDLE, directors_with_middle)
     log_writer.write_directors_to_file(log_writer.LIST_NO_MIDDLE, directors_without_middle)
+    metrics = get_metrics()
     # Fix duplicate firm issues
-    directors_without_middle = unlink_directors_with_duplicate_firms(directors_without_middle, firm_map, log_writer)
-    directors_with_middle = unlink_directors_with_duplicate_firms(directors_with_middle, firm_map, log_writer)
+    with metrics.stage("unlink"):
+        directors_without_middle = unlink_directors_with_duplicate_firms(directors_without_middle, firm_map,
+                                                                         log_writer)
+        directors_with_middle = unlink_directors_with_duplicate_firms(directors_with_middle, firm_map, log_writer)
     # Merge directors with and without middle names
-    directors = merge_directors(directors_with_middle, directors_without_middle)
+    with metrics.stage("merge"):
+        directors = merge_directors(directors_with_middle, directors_without_middle)
     return directors
 
 
@@ -129,7 +302,6 @@ def get_directors_without_middle(entries, firm_map, log_writer):
                 director.associate_with_entry(e)
                 firm = firm_map[e.firm_id]
                 director.add_firm(firm)
-                firm.add_director(director)
         # Otherwise, construct a new director with first name an initial
         else:
             new_director = create_director_from_entries(entries_without_full_first, firm_map)
@@ -195,9 +367,10 @@ def get_directors_with_middle(entries, firm_map, log_writer):
 def get_directors_from_non_singleton_set_with_first_and_middle(entries, firm_map, log_writer):
     """Process a non-singleton set of entries with a common First Initial, Middle Initial, Last Name, and Jr Status.
     
-    A relation set is constructed from the entries. If the relation set is transitive, the relation is an
-    equivalence relation on the entries, and each equivalence class corresponds to a definable director. If the
-    relation is not transitive, the entries are processed by function get_directors_from_intransitive_set.
+    The name relation on the entries is checked for transitivity by get_equivalence_classes. If it is transitive,
+    the relation is an equivalence relation on the entries, and each equivalence class corresponds to a definable
+    director. If the relation is not transitive, the entries are processed by function
+    get_directors_from_intransitive_set.
     
     :param log_writer: log writer
     :param entries: A set of entries S, where each entry has a common First Initial, Middle Initial (not void),
@@ -208,10 +381,9 @@ def get_directors_from_non_singleton_set_with_first_and_middle(entries, firm_map
     """
     directors_from_transitive_sets = []
     directors_from_intransitive_sets = []
-    relation_set = get_relation_set(entries)
-    if check_transitive(relation_set):
-        equivalence_classes = get_equivalence_classes(relation_set)
-        for eq_class in equivalence_classes.values():
+    equivalence_classes = get_equivalence_classes(entries)
+    if equivalence_classes is not None:
+        for eq_class in equivalence_classes:
             new_director = create_director_from_entries(eq_class, firm_map)
             directors_from_transitive_sets.append(new_director)
     else:
@@ -258,12 +430,11 @@ def get_directors_from_intransitive_set(entries, firm_map, log_writer):
         director_from_dual_initials.append(new_director)
 
         # Process entries without dual initials using the check transitivity method.
-        relation_set = get_relation_set(entries_wo_dual_initials)
+        equivalence_classes = get_equivalence_classes(entries_wo_dual_initials)
         # If transitive, construct directors
-        if check_transitive(relation_set):
+        if equivalence_classes is not None:
             directors_from_resulting_transitive_set = []
-            equivalence_classes = get_equivalence_classes(relation_set)
-            for eq_class in equivalence_classes.values():
+            for eq_class in equivalence_classes:
                 new_director = create_director_from_entries(eq_class, firm_map)
                 directors_from_resulting_transitive_set.append(new_director)
             log_writer.write_directors_to_file(log_writer.LIST_AMBIGUOUS_DUAL_INITIAL_CULPRIT, director_from_dual_initials)
@@ -341,7 +512,6 @@ def create_director_from_entry(e, firm_map):
     firm = firm_map[e.firm_id]
     director = Director(*e.get_director_constructor())
     director.add_firm(firm)
-    firm.add_director(director)
     return director
 
 def create_director_from_entries(entries, firm_map):
@@ -350,46 +520,82 @@ def create_director_from_entries(entries, firm_map):
         director.associate_with_entry(e)
         firm = firm_map[e.firm_id]
         director.add_firm(firm)
-        firm.add_director(director)
     return director
 
+def link_directors_to_firms(directors, firms):
+    """Assign each director its index in directors, and record it on each of its firms.
+
+    :param directors: The final list of Directors
+    :param firms: List of all Firms, where each Firm is at position Firm.index
+    """
+    for i, director in enumerate(directors):
+        director.index = i
+        for firm_index in director.firms:
+            firms[firm_index].add_director(director)
+
 ########################
 #  Relation Functions  #
 ########################
 
-def get_relation_set(entries):
-    relation_set = set()
-    for e1 in entries:
-        for e2 in entries:
-            if compare_entries_with_first_and_middle_init_and_same_last_and_suffix(e1, e2):
-                relation_set.add((e1, e2))
-    return relation_set
-
-def check_transitive(relation_set):
-    for e1, e2 in relation_set:
-        for e3, e4 in relation_set:
-            if e2 == e3:
-                if (e1, e4) not in relation_set:
-                    return False
-    return True
-
-def get_equivalence_classes(relation_set):
-    classes = {}  # map from representative entry to eq class, a set
-    for e1, e2 in relation_set:
-        placed = False
-        for representative in classes:
-            if (e1, representative) in relation_set:
-                placed = True
-                classes[representative].add(e1)
-                classes[representative].add(e2)
-        if not placed:
-            classes[e1] = {e1, e2}
-    return classes
+def get_equivalence_classes(entries):
+    """Return the equivalence classes of the name relation on entries, or None if the relation is not transitive.
+
+    Entries are first grouped into name variants, sharing the same First Name and Middle Name. Entries of one
+    variant are related to each other, and to the same entries of other variants, so the relation on entries is
+    transitive exactly when the relation on variants is, and each equivalence class is a union of variants.
+    The comparisons are therefore made between one representative entry of each variant, by name_kernel when
+    there are more than VECTORIZED_COMPARISON_THRESHOLD variants and numpy is installed.
+
+    The relation is reflexive and symmetric, so it is transitive exactly when each of its connected components is
+    a clique, and the components are then the equivalence classes. Each related pair of variants joins the two
+    variants in a union-find structure while the related pairs are counted; the relation is transitive if and
+    only if the count equals the number of pairs within the components.
+
+    :param entries: A set of entries with a common First Initial, Middle Initial, Last Name, and Jr Status.
+    :return: A list of sets of entries, one per equivalence class, or None if the relation is not transitive.
+    """
+    variant_map = {}
+    for e in entries:
+        k = (e.first, e.middle)
+        if k not in variant_map:
+            variant_map[k] = []
+        variant_map[k].append(e)
+    variants = list(variant_map.values())
+
+    num_variants = len(variants)
+    union_find = UnionFind(num_variants)
+    num_related_pairs = 0
+    for i, j in get_related_pairs([v[0] for v in variants]):
+        union_find.union(i, j)
+        num_related_pairs += 1
+
+    components = union_find.get_sets().values()
+    if num_related_pairs != sum(len(c) * (len(c) - 1) // 2 for c in components):
+        return None
+    return [{e for i in c for e in variants[i]} for c in components]
 
 #######################
 #   NAME COMPARISON   #
 #######################
 
+def get_related_pairs(entries):
+    """Return the list of index pairs (i, j), i < j, of the entries related by the name relation."""
+    num_entries = len(entries)
+    metrics = get_metrics()
+    metrics.add("comparisons", num_entries * (num_entries - 1) // 2)
+    metrics.observe("comparison_set_size", num_entries)
+    if num_entries > VECTORIZED_COMPARISON_THRESHOLD and name_kernel.is_available():
+        metrics.add("vectorized_comparisons", num_entries * (num_entries - 1) // 2)
+        rows, columns = name_kernel.get_related_pairs(entries)
+        return list(zip(rows.tolist(), columns.tolist()))
+    pairs = []
+    for i in range(num_entries):
+        e1 = entries[i]
+        for j in range(i + 1, num_entries):
+            if compare_entries_with_first_and_middle_init_and_same_last_and_suffix(e1, entries[j]):
+                pairs.append((i, j))
+    return pairs
+
 def compare_entries_with_first_and_middle_init_and_same_last_and_suffix(e1, e2):
     return compare_first_names(e1, e2) and compare_middle_names(e1, e2)
 
@@ -466,6 +672,7 @@ def unlink_directors_with_duplicate_firms(directors, firm_map, log_writer):
                 if e.full_name not in mapping:
                     mapping[e.full_name] = set()
                 mapping[e.full_name].add(e)
+            get_metrics().add("unlinked_directors")
             for s in mapping.values():
                 new_director = create_director_from_entries(s, firm_map)
                 directors_to_return.append(new_director)
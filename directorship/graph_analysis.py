@@ -0,0 +1,156 @@
+"""
+Statistics of the firm and director graphs of a run, computed from the sparse director-firm incidence matrix
+instead of from the edge lists.
+
+The incidence matrix B has a row per director and a column per firm, holding the number of times the firm is a
+link of the director. The director graph is the off-diagonal part of B B^T, and the firm graph that of B^T B,
+so the value of each pair is the number of links it shares, as in Projection. Two directors, or two firms, are
+connected in their graph if and only if they are connected in the bipartite graph of B, so the connected
+components of both graphs are found once from B, which has far fewer links than the firm graph has edges.
+Requires numpy and scipy.
+"""
+import csv
+import json
+import os
+from array import array
+from .classes.resolution_state import ResolutionState
+from .entry_handler import get_all_directors
+from .log_writer import LogWriter, LOG_LEVEL_NONE
+
+# Number of nodes listed in the top files of each graph by default
+DEFAULT_TOP = 20
+
+
+def import_scipy():
+    """Return the numpy and scipy.sparse modules used by the analysis, raising an ImportError if missing."""
+    try:
+        import numpy
+        import scipy.sparse
+        import scipy.sparse.csgraph
+    except ImportError:
+        raise ImportError("Analyzing graphs requires numpy and scipy. Install them with 'pip install .[analyze]'.")
+    return numpy, scipy.sparse
+
+
+def load_run(output_directory):
+    """Return the directors and firms of a run, in the order of its outputs, from the state in its output directory."""
+    state = ResolutionState.load(output_directory + "state.pickle")
+    firm_map = state.get_firm_map()
+    directors = get_all_directors(state.blocks, firm_map, LogWriter(output_directory, LOG_LEVEL_NONE))
+    return directors, list(firm_map.values())
+
+
+def get_incidence(directors, num_firms):
+    """Return the directors x firms incidence matrix in CSR form."""
+    np, sparse = import_scipy()
+    links = array('I')
+    row_lengths = np.empty(len(directors), dtype=np.int64)
+    for i, d in enumerate(directors):
+        links.extend(d.firms)
+        row_lengths[i] = len(d.firms)
+    indptr = np.zeros(len(directors) + 1, dtype=np.int64)
+    np.cumsum(row_lengths, out=indptr[1:])
+    indices = np.frombuffer(links, dtype=np.uint32).astype(np.int64)
+    data = np.ones(len(indices), dtype=np.int64)
+    incidence = sparse.csr_matrix((data, indices, indptr), shape=(len(directors), num_firms))
+    incidence.sum_duplicates()
+    return incidence
+
+
+def get_projection(incidence):
+    """Return the symmetric weighted adjacency matrix of the projection onto the rows of incidence, in CSR form."""
+    _, sparse = import_scipy()
+    projection = (incidence @ incidence.T).tocsr()
+    projection = (projection - sparse.diags(projection.diagonal(), dtype=projection.dtype)).tocsr()
+    projection.eliminate_zeros()
+    return projection
+
+
+def get_component_labels(incidence):
+    """Return the connected component labels of the directors and of the firms, numbered from 0 on each side."""
+    np, sparse = import_scipy()
+    bipartite = sparse.bmat([[None, incidence], [incidence.T, None]]).tocsr()
+    _, labels = sparse.csgraph.connected_components(bipartite, directed=False)
+    num_directors = incidence.shape[0]
+    _, director_labels = np.unique(labels[:num_directors], return_inverse=True)
+    _, firm_labels = np.unique(labels[num_directors:], return_inverse=True)
+    return director_labels, firm_labels
+
+
+def get_distribution(values):
+    """Return the (value, count) pairs of the distinct values of an array of non-negative integers, in order."""
+    np, _ = import_scipy()
+    counts = np.bincount(values)
+    present = np.flatnonzero(counts)
+    return list(zip(present.tolist(), counts[present].tolist()))
+
+
+def analyze_graph(projection, labels, top):
+    """Return the statistics of the graph of a projection, given the component label of each node, and its top
+    nodes as (index, degree, weighted degree, component size).
+
+    Nodes are ranked by degree, the number of other nodes they share a link with, and then by weighted degree,
+    the number of shared links summed over those nodes.
+    """
+    np, _ = import_scipy()
+    size = projection.shape[0]
+    degrees = np.diff(projection.indptr)
+    weighted_degrees = np.asarray(projection.sum(axis=1)).ravel().astype(np.int64)
+    component_sizes = np.bincount(labels)
+    largest = int(np.argmax(component_sizes)) if size else -1
+    top_indices = np.lexsort((np.arange(size), -weighted_degrees, -degrees))[:top]
+    stats = {
+        "nodes": size,
+        "edges": int(projection.nnz // 2),
+        "edge_list_lines": int(weighted_degrees.sum() // 2),
+        "isolated_nodes": int(np.count_nonzero(degrees == 0)),
+        "max_degree": int(degrees.max()) if size else 0,
+        "mean_degree": float(degrees.mean()) if size else 0.0,
+        "max_weighted_degree": int(weighted_degrees.max()) if size else 0,
+        "components": len(component_sizes),
+        "largest_component_nodes": int(component_sizes[largest]) if size else 0,
+        "largest_component_edges": int(degrees[labels == largest].sum() // 2),
+        "degree_distribution": get_distribution(degrees),
+        "weighted_degree_distribution": get_distribution(weighted_degrees),
+        "component_size_distribution": get_distribution(component_sizes),
+    }
+    top_nodes = [(int(i), int(degrees[i]), int(weighted_degrees[i]), int(component_sizes[labels[i]]))
+                 for i in top_indices]
+    return stats, top_nodes
+
+
+def analyze_run(directors, firms, top=DEFAULT_TOP):
+    """Return a mapping from "firms" and "directors" to the statistics and top nodes of each graph."""
+    incidence = get_incidence(directors, len(firms))
+    director_labels, firm_labels = get_component_labels(incidence)
+    results = {}
+    for name, objects, matrix, labels in [("firms", firms, incidence.T.tocsr(), firm_labels),
+                                          ("directors", directors, incidence, director_labels)]:
+        stats, top_nodes = analyze_graph(get_projection(matrix), labels, top)
+        stats["top"] = [{"id": i, "name": objects[i].get_adj_matrix_ref(), "degree": degree,
+                         "weighted_degree": weighted_degree, "component_nodes": component_nodes}
+                        for i, degree, weighted_degree, component_nodes in top_nodes]
+        results[name] = stats
+    return results
+
+
+def write_analysis(directory, results):
+    """Write summary.json, and for each graph its distributions and top nodes as .csv files, to directory."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "summary.json"), 'w') as f:
+        summary = {name: {k: v for k, v in stats.items() if not k.endswith("distribution")}
+                   for name, stats in results.items()}
+        json.dump(summary, f, indent=2)
+    for name, stats in results.items():
+        for distribution, header in [("degree_distribution", "degree"),
+                                     ("weighted_degree_distribution", "weighted_degree"),
+                                     ("component_size_distribution", "component_nodes")]:
+            with open(os.path.join(directory, "{}_{}.csv".format(name, distribution)), 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow([header, "count"])
+                writer.writerows(stats[distribution])
+        with open(os.path.join(directory, "{}_top.csv".format(name)), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "name", "degree", "weighted_degree", "component_nodes"])
+            writer.writerows([node["id"], node["name"], node["degree"], node["weighted_degree"],
+                              node["component_nodes"]] for node in stats["top"])
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import mmap
+import os
+import sys
+from array import array
+from . import columnar_reader, csv_reader
+from .classes.entry_table import EntryTable, STRING_COLUMNS
+
+# Incremented whenever the layout of the cache changes, so that older caches are ignored
+CACHE_VERSION = 3
+MAGIC = b"DIRTABLE"
+
+
+def get_cache_key(input_path):
+    """Return the key of the cache of input_path: a hash of its contents and the column indices of csv_reader."""
+    file_hash = hashlib.sha256()
+    with open(input_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            file_hash.update(block)
+    columns = [csv_reader.FIRM_NAME_COL, csv_reader.FIRST_COL, csv_reader.MIDDLE_COL, csv_reader.LAST_COL,
+               csv_reader.SUFFIX_COL, csv_reader.FIRM_ID_COL, csv_reader.FULL_NAME_COL, csv_reader.ADDRESS_COL]
+    return "{}:{}:{}".format(CACHE_VERSION, file_hash.hexdigest(), ",".join(str(c) for c in columns))
+
+
+def write_table(path, table, key, bad_rows=()):
+    """Write an EntryTable, and the rows skipped when parsing it, to a binary cache file.
+
+    The file holds MAGIC, the length of a JSON header, the header, and then the column data: the distinct
+    values of the string columns as JSON lists, and the integer codes, firms and flags as raw arrays. The
+    header holds the key, the byte order, the number of rows, the skipped rows, and the offset and length of
+    each column.
+    The file is written to a temporary path and then renamed, so an interrupted write leaves no cache.
+    """
+    blobs = [("firm_ids", json.dumps(table.firm_ids).encode()),
+             ("firm_names", json.dumps(table.firm_names).encode()),
+             ("firms", table.firms.tobytes()),
+             ("flags", bytes(table.flags))]
+    for name in STRING_COLUMNS:
+        column = getattr(table, name)
+        blobs.append((name + ".values", json.dumps(column.values).encode()))
+        blobs.append((name + ".codes", column.codes.tobytes()))
+
+    sections = {}
+    offset = 0
+    for name, blob in blobs:
+        sections[name] = [offset, len(blob)]
+        offset += len(blob)
+    header = json.dumps({"key": key, "byteorder": sys.byteorder, "rows": len(table),
+                         "bad_rows": [list(bad_row) for bad_row in bad_rows], "sections": sections}).encode()
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for _, blob in blobs:
+            f.write(blob)
+    os.replace(temporary_path, path)
+
+
+def read_table(path, key):
+    """Read an EntryTable and its skipped rows from a cache file, or return None if the file is not a cache with the
+    given key.
+
+    The file is memory-mapped, and each column is copied out of the map in a single block, into the arrays and
+    lists of an EntryTable that later rows can be appended to, so no row is parsed again but the table does not
+    share memory with the file.
+    """
+    if not os.path.isfile(path) or os.path.getsize(path) < len(MAGIC) + 8:
+        return None
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if mapped[:len(MAGIC)] != MAGIC:
+            return None
+        header_length = int.from_bytes(mapped[len(MAGIC):len(MAGIC) + 8], "little")
+        data_offset = len(MAGIC) + 8 + header_length
+        header = json.loads(mapped[len(MAGIC) + 8:data_offset])
+        if header["key"] != key:
+            return None
+        sections = header["sections"]
+        swap = header["byteorder"] != sys.byteorder
+
+        with memoryview(mapped) as view:
+            def get_section(name):
+                offset, length = sections[name]
+                return view[data_offset + offset:data_offset + offset + length]
+
+            def get_array(name):
+                values = array('I')
+                with get_section(name) as section:
+                    values.frombytes(section)
+                if swap:
+                    values.byteswap()
+                return values
+
+            def get_list(name):
+                with get_section(name) as section:
+                    return json.loads(bytes(section))
+
+            table = EntryTable()
+            table.firm_ids = get_list("firm_ids")
+            table.firm_names = get_list("firm_names")
+            table.firm_index_map = {firm_id: i for i, firm_id in enumerate(table.firm_ids)}
+            table.firms = get_array("firms")
+            with get_section("flags") as section:
+                table.flags = bytearray(section)
+            for name in STRING_COLUMNS:
+                column = getattr(table, name)
+                column.values = get_list(name + ".values")
+                column.code_map = {value: code for code, value in enumerate(column.values)}
+                column.codes = get_array(name + ".codes")
+    if len(table) != header["rows"]:
+        return None
+    return table, [tuple(bad_row) for bad_row in header["bad_rows"]]
+
+
+def read_input_with_cache(input_path, cache_path, workers=1):
+    """Read the EntryTable of input_path from the cache at cache_path, parsing the input with
+    columnar_reader.parse_input and writing the cache if it is missing or was written for another input or other
+    column indices.
+
+    :return: The EntryTable, the rows skipped, see CsvReader.bad_rows, and whether they were read from the cache
+    """
+    key = get_cache_key(input_path)
+    cached = read_table(cache_path, key)
+    if cached is not None:
+        table, bad_rows = cached
+        return table, bad_rows, True
+    table, bad_rows = columnar_reader.parse_input(input_path, workers)
+    write_table(cache_path, table, key, bad_rows)
+    return table, bad_rows, False
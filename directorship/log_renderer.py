@@ -0,0 +1,96 @@
+import json
+import os
+from .classes.director import Director
+from .classes.entry_table import EntryTable
+from .columnar_reader import open_input
+from .log_writer import LogWriter
+
+
+def read_provenance(path):
+    """Read a provenance log written by ProvenanceLogWriter.
+
+    :param path: Path to provenance.jsonl
+    :return: The header, the list of director records, and the counts of the lists
+    """
+    with open(path, encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    if len(lines) < 2 or "lists" not in lines[0] or "counts" not in lines[-1]:
+        raise ValueError("'{}' is not a complete provenance log".format(path))
+    return lines[0], lines[1:-1], lines[-1]["counts"]
+
+
+def get_director_info(table, record, num_entries):
+    """Return the info of the director of record when it had its first num_entries entries."""
+    entries = [table[i] for i in record["entries"][:num_entries]]
+    director = Director(*entries[0].get_director_constructor())
+    for e in entries[1:]:
+        director.associate_with_entry(e)
+    return director.get_info()
+
+
+def read_inputs(input_paths):
+    """Read the rows of the input files of a run, in order, into one EntryTable."""
+    table = EntryTable()
+    for input_path in input_paths:
+        with open_input(input_path, table=table) as reader:
+            for _ in reader.read_chunks():
+                pass
+    return table
+
+
+def render_logs(provenance_path, output_directory, input_paths=None, list_names=None):
+    """Write the text lists of a provenance log, as they would have been written by LogWriter.
+
+    The entries are re-read from the input files, so they must be unchanged since the run.
+
+    :param provenance_path: Path to provenance.jsonl
+    :param output_directory: Directory to write the text lists to, ending in a separator
+    :param input_paths: Input files of the run, by default those recorded in the log
+    :param list_names: Names of the lists to write, by default all of them
+    :return: List of paths written
+    """
+    header, records, counts = read_provenance(provenance_path)
+    names = header["lists"]
+    if list_names is None:
+        list_numbers = range(len(names))
+    else:
+        list_numbers = []
+        for name in list_names:
+            name = name[:-len(".txt")] if name.endswith(".txt") else name
+            if name not in names:
+                raise ValueError("Unknown list '{}'. Lists are: {}".format(name, ", ".join(names)))
+            list_numbers.append(names.index(name))
+    table = read_inputs(input_paths or header["input"])
+
+    log_writer = LogWriter(output_directory)
+    paths = list(log_writer.LISTS)
+    merged = log_writer.LISTS[log_writer.LIST_MERGED_DIRECTORS]
+    texts = [[] for _ in names]
+    records_by_id = {record["id"]: record for record in records}
+    for record in records:
+        for order, list_number, num_entries in record["lists"]:
+            if list_number in list_numbers:
+                texts[list_number].append((order, get_director_info(table, record, num_entries)))
+        for order, list_number, other_id, num_entries, num_other_entries, num_entries_after in record["merges"]:
+            if list_number not in list_numbers:
+                continue
+            other_info = get_director_info(table, records_by_id[other_id], num_other_entries)
+            info = get_director_info(table, record, num_entries)
+            if list_number == merged:
+                text = other_info + "MERGED WITH\n" + info + \
+                       "RESULTING DIRECTOR\n" + get_director_info(table, record, num_entries_after)
+            else:
+                text = other_info + "Could not be merged with\n" + info
+            texts[list_number].append((order, text + "*------------------------------------------*\n"))
+
+    os.makedirs(output_directory, exist_ok=True)
+    written = []
+    for list_number in list_numbers:
+        path = paths[list_number]
+        texts[list_number].sort(key=lambda t: t[0])
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(log_writer.HEADERS[path])
+            f.write("".join(text for _, text in texts[list_number]))
+            f.write("\nCount: {}".format(counts[list_number]))
+        written.append(path)
+    return written
@@ -1,8 +1,30 @@
+import json
+import os
+import queue
+import threading
+
+LOG_LEVEL_NONE = 'none'
+LOG_LEVEL_COUNTS = 'counts'
+LOG_LEVEL_FULL = 'full'
+LOG_LEVELS = [LOG_LEVEL_NONE, LOG_LEVEL_COUNTS, LOG_LEVEL_FULL]
+
+# Number of buffered characters above which the buffers are handed to the writer thread
+BUFFER_SIZE = 1 << 20
+
 
 class LogWriter:
+    """
+    Writes the lists of directors to the log directory.
+
+    Text is buffered per list and handed in large pieces to a background thread, which keeps each
+    file open, so close() must be called once logging is done. At log level 'counts' only the header
+    and count of each list are written, and at log level 'none' no files are written. The counts are
+    kept at every level.
+    """
 
-    def __init__(self, log_directory):
+    def __init__(self, log_directory, log_level=LOG_LEVEL_FULL):
         self.output_directory = log_directory
+        self.log_level = log_level
         self.LIST_SINGLETONS = log_directory + "singletons.txt"
         self.LIST_NON_SINGLETONS = log_directory + "non singletons.txt"
         self.LIST_MIDDLE = log_directory + "middle name present.txt"
@@ -45,110 +67,331 @@ class LogWriter:
             self.LIST_DIRECTORS_CONSTRUCTED_FROM_DUPLICATE_FIRM_ISSUE: 18
         }
 
+        self.HEADERS = {
+            self.LIST_SINGLETONS:
+                "List of Directors constructed from an entry with unique (First Initial, Last, Suffix)\n\n",
+            self.LIST_NON_SINGLETONS:
+                "List of Directors constructed from entries without a unique (First Initial, Last, Suffix)\n\n",
+            self.LIST_MIDDLE:
+                "List of Directors constructed from entries with a non-void Middle\n\n",
+            self.LIST_NO_MIDDLE:
+                "List of Directors constructed from entries with a void Middle\n\n",
+            self.LIST_NO_MIDDLE_FIRST_FULL:
+                "List of Directors constructed from entries with a void Middle and full First\n\n",
+            self.LIST_NO_MIDDLE_FIRST_INITIAL:
+                "List of Directors constructed from entries with a void Middle and non-full First\n\n",
+            self.LIST_MIDDLE_SINGLETONS:
+                "List of Directors constructed from an entry with a unique "
+                "(First Initial, Middle Initial, Last, Suffix)\n\n",
+            self.LIST_MIDDLE_NON_SINGLETONS:
+                "List of Directors constructed from entries without a unique "
+                "(First Initial, Middle Initial, Last, Suffix)\n\n",
+            self.LIST_MIDDLE_NON_SINGLETONS_UNAMBIGUOUS:
+                "List of Directors constructed from entries that are transitive "
+                "under the name equivalence relation\n\n",
+            self.LIST_MIDDLE_NON_SINGLETONS_AMBIGUOUS:
+                "List of Directors constructed from entries that are not transitive "
+                "under the name equivalence relation\n\n",
+            self.LIST_AMBIGUOUS_DUAL_INITIAL_CULPRIT:
+                "List of Directors with dual initials that are the cause of intransitivity "
+                "with otherwise transitive entries\n\n",
+            self.LIST_AMBIGUOUS_DUAL_INITIAL_NON_CULPRIT:
+                "List of Directors with dual initials that are NOT the cause of "
+                "intransitivity with intransitive entries\n\n",
+            self.LIST_UNAMBIGUOUS_WITH_DUAL_INITIAL_REMOVED:
+                "List of Directors with at least one of First or Middle Full, "
+                "that are transitive when dual initial entries removed \n\n",
+            self.LIST_TRULY_AMBIGUOUS:
+                "List of Directors with at least one of First or Middle Full, "
+                "that remain intransitive when dual initial entries removed \n\n",
+            self.LIST_DUPLICATE_FIRM_ADDED:
+                "List of Directors for which a duplicate firm was added \n\n",
+            self.LIST_ALL_DIRECTORS:
+                "List of all Directors constructed\n\n",
+            self.LIST_MERGED_DIRECTORS:
+                "List of Directors that were merged together\n\n",
+            self.LIST_BAD_MERGE_DIRECTORS:
+                "List of Directors that could not be merged because they sit on the same board\n\n",
+            self.LIST_DIRECTORS_CONSTRUCTED_FROM_DUPLICATE_FIRM_ISSUE:
+                "List of Directors that were constructed from a director flagged "
+                "for association with duplicate firms\n\n"
+        }
+
         self.COUNTS = [0 for _ in range(len(self.LISTS))]
 
+        self.buffers = {path: [] for path in self.LISTS}
+        self.buffered_size = 0
+        self.queue = None
+        self.thread = None
+        self.thread_error = None
+
+    def write_to_file(self, path, text):
+        self.buffers[path].append(text)
+        self.buffered_size += len(text)
+        if self.buffered_size > BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Hand the buffered text to the writer thread, raising the error of the thread if it failed."""
+        if self.thread_error is not None:
+            raise self.thread_error
+        if self.buffered_size == 0:
+            return
+        if self.thread is None:
+            self.queue = queue.Queue(maxsize=16)
+            self.thread = threading.Thread(target=self.run_writer_thread, daemon=True)
+            self.thread.start()
+        for path, buffer in self.buffers.items():
+            if buffer:
+                self.queue.put((path, "".join(buffer)))
+                buffer.clear()
+        self.buffered_size = 0
+
+    def close(self):
+        """Write all buffered text and wait for the writer thread to finish, raising its error if it failed."""
+        try:
+            self.flush()
+        finally:
+            if self.thread is not None:
+                self.queue.put(None)
+                self.thread.join()
+                self.thread = None
+        if self.thread_error is not None:
+            raise self.thread_error
+
+    def run_writer_thread(self):
+        files = {}
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                path, text = item
+                if path not in files:
+                    files[path] = open(path, 'a', encoding='utf-8')
+                files[path].write(text)
+        except Exception as e:
+            # Raised in the logging thread by the next flush or close
+            self.thread_error = e
+            # Keep consuming so that writers waiting on the queue are not blocked
+            while self.queue.get() is not None:
+                pass
+        finally:
+            for file in files.values():
+                file.close()
+
     def write_directors_to_file(self, path, directors):
         self.COUNTS[self.LISTS[path]] += len(directors)
         directors.sort(key=lambda d: (d.last, d.first, d.middle, d.suffix))
-        file = open(path, 'a')
-        for director in directors:
-            file.write(director.get_info())
-        file.close()
+        if self.log_level == LOG_LEVEL_FULL:
+            self.write_to_file(path, "".join(director.get_info() for director in directors))
+
+    def write_infos_to_file(self, path, infos):
+        """Write the get_info() of directors no longer held, as write_directors_to_file would have, in order."""
+        self.COUNTS[self.LISTS[path]] += len(infos)
+        if self.log_level == LOG_LEVEL_FULL:
+            self.write_to_file(path, "".join(infos))
 
     def write_merged_directors(self, director_with_middle, director_wo_middle):
         self.COUNTS[self.LISTS[self.LIST_MERGED_DIRECTORS]] += 1
-        file = open(self.LIST_MERGED_DIRECTORS, 'a')
-        file.write(director_wo_middle.get_info())
-        file.write("MERGED WITH\n")
-        file.write(director_with_middle.get_info())
-        file.close()
+        if self.log_level == LOG_LEVEL_FULL:
+            self.write_to_file(self.LIST_MERGED_DIRECTORS,
+                               director_wo_middle.get_info() +
+                               "MERGED WITH\n" +
+                               director_with_middle.get_info())
 
     def write_result_from_merge(self, director):
-        file = open(self.LIST_MERGED_DIRECTORS, 'a')
-        file.write("RESULTING DIRECTOR\n")
-        file.write(director.get_info())
-        file.write("*------------------------------------------*\n")
-        file.close()
+        if self.log_level == LOG_LEVEL_FULL:
+            self.write_to_file(self.LIST_MERGED_DIRECTORS,
+                               "RESULTING DIRECTOR\n" +
+                               director.get_info() +
+                               "*------------------------------------------*\n")
 
     def write_bad_merge_directors(self, director_with_middle, director_wo_middle):
         self.COUNTS[self.LISTS[self.LIST_BAD_MERGE_DIRECTORS]] += 1
-        file = open(self.LIST_BAD_MERGE_DIRECTORS, 'a')
-        file.write(director_wo_middle.get_info())
-        file.write("Could not be merged with\n")
-        file.write(director_with_middle.get_info())
-        file.write("*------------------------------------------*\n")
-        file.close()
+        if self.log_level == LOG_LEVEL_FULL:
+            self.write_to_file(self.LIST_BAD_MERGE_DIRECTORS,
+                               director_wo_middle.get_info() +
+                               "Could not be merged with\n" +
+                               director_with_middle.get_info() +
+                               "*------------------------------------------*\n")
+
+    def create_recorder(self):
+        """Return a log writer to be used in a worker process, whose results are passed to write_result."""
+        return LogRecorder(self.output_directory, self.log_level)
+
+    def write_result(self, result, directors):
+        """Write the result of a recorder, in which directors were returned from the worker process."""
+        records, counts = result
+        paths = list(self.LISTS)
+        for list_number, text in records:
+            self.write_to_file(paths[list_number], text)
+        for list_number, count in enumerate(counts):
+            self.COUNTS[list_number] += count
 
     def write_counts(self):
+        if self.log_level == LOG_LEVEL_NONE:
+            return
         for path in self.LISTS:
-            with open(path, 'a') as f:
-                f.write("\nCount: {}".format(self.COUNTS[self.LISTS[path]]))
-                f.close()
+            self.write_to_file(path, "\nCount: {}".format(self.COUNTS[self.LISTS[path]]))
+
+    def initialize_text_files(self):
+        if self.log_level == LOG_LEVEL_NONE:
+            return
+        for path, header in self.HEADERS.items():
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(header)
+
+class LogRecorder(LogWriter):
+    """
+    A LogWriter that records the text it would write, as (list number, text) pairs, instead of
+    writing it. The records and counts are plain data, so they can be returned from a worker process
+    and written in order by LogWriter.write_result.
+    """
+
+    def __init__(self, log_directory, log_level=LOG_LEVEL_FULL):
+        super().__init__(log_directory, log_level)
+        self.records = []
+
+    def clear(self):
+        self.records = []
+        self.COUNTS = [0 for _ in range(len(self.LISTS))]
+
+    def get_result(self, directors):
+        return self.records, self.COUNTS
+
+    def write_to_file(self, path, text):
+        self.records.append((self.LISTS[path], text))
+
+
+class ProvenanceLogWriter(LogWriter):
+    """
+    Writes a single JSON Lines log, provenance.jsonl, in place of the text lists.
+
+    The first line holds the input files and the names of the lists, and the last line the count of
+    each list. Every other line is the record of one director, written once, at close():
+
+        id        number of the record, in order of the director's first appearance in a list
+        director  index of the director in the final list of directors, or null if it was discarded
+        name      name of the director
+        entries   row indices (not counting the header row) of the entries of the director, in order
+        aliases   sorted distinct full names of the entries
+        lists     [order, list number, number of entries] for each time the director was listed
+        merges    [order, list number, id of the other director, number of entries, number of entries
+                  of the other director, number of entries after the merge (or null if it failed)]
+                  for each merge attempted into the director
+
+    Orders give the position of each listing among all listings of the run, and numbers of entries
+    give the prefix of entries the director had at the time, so the text lists can be regenerated by
+    log_renderer.render_logs.
+    """
+
+    def __init__(self, log_directory, log_level=LOG_LEVEL_FULL, input_paths=None):
+        super().__init__(log_directory, log_level)
+        self.PROVENANCE = log_directory + "provenance.jsonl"
+        self.input_paths = input_paths
+        self.clear()
+
+    def clear(self):
+        self.records = {}
+        self.detached_records = []
+        self.num_records = 0
+        self.order = 0
+        self.COUNTS = [0 for _ in range(len(self.LISTS))]
+
+    def get_record(self, director):
+        record = self.records.get(director)
+        if record is None:
+            record = {"id": self.num_records, "lists": [], "merges": []}
+            self.num_records += 1
+            self.records[director] = record
+        return record
+
+    def complete_record(self, director, record):
+        return {"id": record["id"],
+                "director": director.index,
+                "name": str(director),
+                "entries": [e.index for e in director.entries],
+                "aliases": sorted(director.get_aliases()),
+                "lists": record["lists"],
+                "merges": record["merges"]}
+
+    def write_directors_to_file(self, path, directors):
+        self.COUNTS[self.LISTS[path]] += len(directors)
+        directors.sort(key=lambda d: (d.last, d.first, d.middle, d.suffix))
+        if self.log_level == LOG_LEVEL_FULL:
+            for director in directors:
+                self.get_record(director)["lists"].append([self.order, self.LISTS[path], len(director.entries)])
+                self.order += 1
+
+    def write_merge(self, path, director_with_middle, director_wo_middle):
+        other_id = self.get_record(director_wo_middle)["id"]
+        self.get_record(director_with_middle)["merges"].append(
+            [self.order, self.LISTS[path], other_id, len(director_with_middle.entries),
+             len(director_wo_middle.entries), None])
+        self.order += 1
+
+    def write_merged_directors(self, director_with_middle, director_wo_middle):
+        self.COUNTS[self.LISTS[self.LIST_MERGED_DIRECTORS]] += 1
+        if self.log_level == LOG_LEVEL_FULL:
+            self.write_merge(self.LIST_MERGED_DIRECTORS, director_with_middle, director_wo_middle)
+
+    def write_result_from_merge(self, director):
+        if self.log_level == LOG_LEVEL_FULL:
+            self.records[director]["merges"][-1][5] = len(director.entries)
+
+    def write_bad_merge_directors(self, director_with_middle, director_wo_middle):
+        self.COUNTS[self.LISTS[self.LIST_BAD_MERGE_DIRECTORS]] += 1
+        if self.log_level == LOG_LEVEL_FULL:
+            self.write_merge(self.LIST_BAD_MERGE_DIRECTORS, director_with_middle, director_wo_middle)
+
+    def write_counts(self):
+        # Counts are written as the last line of the log by close()
+        pass
 
     def initialize_text_files(self):
-        with open(self.LIST_SINGLETONS, 'w') as f:
-            f.write("List of Directors constructed from an entry with unique (First Initial, Last, Suffix)\n\n")
-            f.close()
-        with open(self.LIST_NON_SINGLETONS, 'w') as f:
-            f.write("List of Directors constructed from entries without a unique (First Initial, Last, Suffix)\n\n")
-            f.close()
-        with open(self.LIST_MIDDLE, 'w') as f:
-            f.write("List of Directors constructed from entries with a non-void Middle\n\n")
-            f.close()
-        with open(self.LIST_NO_MIDDLE, 'w') as f:
-            f.write("List of Directors constructed from entries with a void Middle\n\n")
-            f.close()
-        with open(self.LIST_NO_MIDDLE_FIRST_FULL, 'w') as f:
-            f.write("List of Directors constructed from entries with a void Middle and full First\n\n")
-            f.close()
-        with open(self.LIST_NO_MIDDLE_FIRST_INITIAL, 'w') as f:
-            f.write("List of Directors constructed from entries with a void Middle and non-full First\n\n")
-            f.close()
-        with open(self.LIST_MIDDLE_SINGLETONS, 'w') as f:
-            f.write("List of Directors constructed from an entry with a unique "
-                    "(First Initial, Middle Initial, Last, Suffix)\n\n")
-            f.close()
-        with open(self.LIST_MIDDLE_NON_SINGLETONS, 'w') as f:
-            f.write("List of Directors constructed from entries without a unique "
-                    "(First Initial, Middle Initial, Last, Suffix)\n\n")
-            f.close()
-        with open(self.LIST_MIDDLE_NON_SINGLETONS_UNAMBIGUOUS, 'w') as f:
-            f.write("List of Directors constructed from entries that are transitive "
-                    "under the name equivalence relation\n\n")
-            f.close()
-        with open(self.LIST_MIDDLE_NON_SINGLETONS_AMBIGUOUS, 'w') as f:
-            f.write("List of Directors constructed from entries that are not transitive "
-                    "under the name equivalence relation\n\n")
-            f.close()
-        with open(self.LIST_AMBIGUOUS_DUAL_INITIAL_CULPRIT, 'w') as f:
-            f.write("List of Directors with dual initials that are the cause of intransitivity "
-                    "with otherwise transitive entries\n\n")
-            f.close()
-        with open(self.LIST_AMBIGUOUS_DUAL_INITIAL_NON_CULPRIT, 'w') as f:
-            f.write("List of Directors with dual initials that are NOT the cause of "
-                    "intransitivity with intransitive entries\n\n")
-            f.close()
-        with open(self.LIST_UNAMBIGUOUS_WITH_DUAL_INITIAL_REMOVED, 'w') as f:
-            f.write("List of Directors with at least one of First or Middle Full, "
-                    "that are transitive when dual initial entries removed \n\n")
-            f.close()
-        with open(self.LIST_TRULY_AMBIGUOUS, 'w') as f:
-            f.write("List of Directors with at least one of First or Middle Full, "
-                    "that remain intransitive when dual initial entries removed \n\n")
-            f.close()
-        with open(self.LIST_DUPLICATE_FIRM_ADDED, 'w') as f:
-            f.write("List of Directors for which a duplicate firm was added \n\n")
-            f.close()
-        with open(self.LIST_ALL_DIRECTORS, 'w') as f:
-            f.write("List of all Directors constructed\n\n")
-            f.close()
-        with open(self.LIST_MERGED_DIRECTORS, 'w') as f:
-            f.write("List of Directors that were merged together\n\n")
-            f.close()
-        with open(self.LIST_BAD_MERGE_DIRECTORS, 'w') as f:
-            f.write("List of Directors that could not be merged because they sit on the same board\n\n")
-            f.close()
-        with open(self.LIST_DIRECTORS_CONSTRUCTED_FROM_DUPLICATE_FIRM_ISSUE, 'w') as f:
-            f.write("List of Directors that were constructed from a director flagged "
-                    "for association with duplicate firms\n\n")
-            f.close()
+        pass
+
+    def create_recorder(self):
+        return ProvenanceLogWriter(self.output_directory, self.log_level)
+
+    def get_result(self, directors):
+        """Return the records of a worker, completing those of directors discarded in the worker."""
+        returned = set(directors)
+        detached_records = [self.complete_record(d, r) for d, r in self.records.items() if d not in returned]
+        records = [self.records.get(d) for d in directors]
+        return detached_records, records, self.num_records, self.order, self.COUNTS
+
+    def write_result(self, result, directors):
+        detached_records, records, num_records, order, counts = result
+        for record in detached_records + [r for r in records if r is not None]:
+            record["id"] += self.num_records
+            for listing in record["lists"]:
+                listing[0] += self.order
+            for merge in record["merges"]:
+                merge[0] += self.order
+                merge[2] += self.num_records
+        self.detached_records += detached_records
+        for director, record in zip(directors, records):
+            if record is not None:
+                self.records[director] = record
+        self.num_records += num_records
+        self.order += order
+        for list_number, count in enumerate(counts):
+            self.COUNTS[list_number] += count
+
+    def get_records(self):
+        """Return the completed records of all directors, in order of their id."""
+        records = [self.complete_record(d, r) for d, r in self.records.items()] + self.detached_records
+        records.sort(key=lambda r: r["id"])
+        return records
+
+    def close(self):
+        if self.log_level == LOG_LEVEL_NONE:
+            return
+        with open(self.PROVENANCE, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"input": self.input_paths,
+                                "lists": [os.path.basename(path)[:-len(".txt")] for path in self.LISTS]}) + "\n")
+            for record in self.get_records():
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.write(json.dumps({"counts": self.COUNTS}) + "\n")
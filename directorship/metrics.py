@@ -0,0 +1,157 @@
+import contextlib
+import json
+import sys
+import time
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def get_peak_memory_mb():
+    """Return the peak resident memory of this process in MB, or None if it cannot be measured."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def get_histogram_bucket(value):
+    """Return the power of two range holding value, e.g. "4-7"."""
+    if value < 2:
+        return str(value)
+    low = 1 << (value.bit_length() - 1)
+    return "{}-{}".format(low, 2 * low - 1)
+
+
+class Metrics:
+    """
+    Records the wall time, CPU time and memory of the stages of a run, along with counters and histograms,
+    to be written as JSON.
+
+    Stages may nest, e.g. "unlink" and "merge" are timed within "resolve", and a stage entered several
+    times accumulates its times. The resident memory of the process only has a peak over its whole life, so
+    each stage records peak_rss_growth_mb, the amount by which it raised that peak, summed over its calls,
+    and process_peak_rss_mb, the peak of the process when it last ended. A stage that only reuses memory
+    freed by an earlier one shows no growth.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.histograms = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        wall_time = time.perf_counter()
+        cpu_time = time.process_time()
+        peak_memory = get_peak_memory_mb()
+        try:
+            yield
+        finally:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_growth_mb": None,
+                         "process_peak_rss_mb": None}
+                self.stages[name] = stage
+            stage["calls"] += 1
+            stage["wall_seconds"] += time.perf_counter() - wall_time
+            stage["cpu_seconds"] += time.process_time() - cpu_time
+            if peak_memory is not None:
+                stage["process_peak_rss_mb"] = get_peak_memory_mb()
+                stage["peak_rss_growth_mb"] = (stage["peak_rss_growth_mb"] or 0.0) + \
+                    stage["process_peak_rss_mb"] - peak_memory
+
+    def add(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        """Add value to the histogram name, in power of two buckets."""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = {}
+            self.histograms[name] = histogram
+        bucket = get_histogram_bucket(value)
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+
+    def get_data(self):
+        return {"stages": self.stages, "counters": self.counters, "histograms": self.histograms}
+
+    def merge(self, data):
+        """Add the data of another Metrics, e.g. returned from a worker process. The memory of its stages is that
+        of another process, so only their times are added."""
+        for name, other in data["stages"].items():
+            stage = self.stages.get(name)
+            if stage is None:
+                self.stages[name] = dict(other, peak_rss_growth_mb=None, process_peak_rss_mb=None)
+            else:
+                stage["calls"] += other["calls"]
+                stage["wall_seconds"] += other["wall_seconds"]
+                stage["cpu_seconds"] += other["cpu_seconds"]
+        for name, value in data["counters"].items():
+            self.add(name, value)
+        for name, other in data["histograms"].items():
+            histogram = self.histograms.setdefault(name, {})
+            for bucket, count in other.items():
+                histogram[bucket] = histogram.get(bucket, 0) + count
+
+    def write(self, path):
+        histograms = {name: dict(sorted(histogram.items(), key=lambda item: int(item[0].split("-")[0])))
+                      for name, histogram in self.histograms.items()}
+        with open(path, 'w') as f:
+            json.dump({"stages": self.stages, "counters": self.counters, "histograms": histograms}, f, indent=2)
+
+
+class NullMetrics:
+    """Metrics that record nothing, used when no metrics are requested."""
+
+    def stage(self, name):
+        return contextlib.nullcontext()
+
+    def add(self, name, value=1):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+    def merge(self, data):
+        pass
+
+
+_metrics = NullMetrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def set_metrics(metrics):
+    global _metrics
+    _metrics = metrics
+
+
+class Progress:
+    """
+    Reports the progress of a loop over total items, with throughput and estimated time remaining,
+    at most once per interval seconds.
+    """
+
+    def __init__(self, description, total, interval=1.0):
+        self.description = description
+        self.total = total
+        self.interval = interval
+        self.start_time = time.perf_counter()
+        self.last_report_time = self.start_time
+
+    def update(self, done, **counts):
+        now = time.perf_counter()
+        if now - self.last_report_time < self.interval:
+            return
+        self.last_report_time = now
+        elapsed = now - self.start_time
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - done) / rate if rate > 0 else float("inf")
+        extra = "".join(", {:.0f} {}/s".format(count / elapsed, name) for name, count in counts.items())
+        print("\t{} {} of {} ({:.0f}/s{}, ETA {:.0f} s)".format(self.description, done, self.total, rate, extra,
+                                                                  eta))
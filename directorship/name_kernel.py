@@ -0,0 +1,84 @@
+"""
+Vectorized name relation for large blocks of entries.
+
+The First Names and Middle Names of a block are encoded as integer codes, together with the codes of their
+initials and whether each is an initial, and the name relation of compare_first_names and compare_middle_names
+is evaluated for all pairs at once with NumPy broadcasting. Requires numpy; is_available() reports whether it
+is installed.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Maximum number of matrix elements evaluated at once
+CHUNK_ELEMENTS = 1 << 24
+
+
+def is_available():
+    return np is not None
+
+
+def encode_names(entries):
+    """Return arrays of first codes, first initial codes, first is initial flags, and the same for middle names."""
+    codes = {}
+    columns = [[] for _ in range(6)]
+    for e in entries:
+        for column, value in zip(columns, (e.first, e.first_init, e.middle, e.middle_init)):
+            column.append(codes.setdefault(value, len(codes)))
+        columns[4].append(e.is_first_init)
+        columns[5].append(e.is_middle_init)
+    first, first_init, middle, middle_init, is_first_init, is_middle_init = columns
+    return (np.array(first, dtype=np.int64), np.array(first_init, dtype=np.int64), np.array(is_first_init, dtype=bool),
+            np.array(middle, dtype=np.int64), np.array(middle_init, dtype=np.int64), np.array(is_middle_init, dtype=bool))
+
+
+def get_relation_rows(encoded, start, stop):
+    """Return the boolean relation between entries start, ..., stop - 1 (rows) and all entries (columns)."""
+    first, first_init, is_first_init, middle, middle_init, is_middle_init = encoded
+    rows = slice(start, stop)
+    first_related = (first[rows, None] == first[None, :]) | \
+                    ((is_first_init[rows, None] | is_first_init[None, :]) & (first_init[rows, None] == first_init[None, :]))
+    middle_related = (middle[rows, None] == middle[None, :]) | \
+                     ((is_middle_init[rows, None] | is_middle_init[None, :]) & (middle_init[rows, None] == middle_init[None, :]))
+    return first_related & middle_related
+
+
+def get_row_chunks(size):
+    chunk_rows = max(1, CHUNK_ELEMENTS // max(size, 1))
+    for start in range(0, size, chunk_rows):
+        yield start, min(start + chunk_rows, size)
+
+
+def get_relation_matrix(entries, packed=False):
+    """Return the boolean matrix of the name relation between all pairs of entries.
+
+    :param entries: A list of entries
+    :param packed: If True, each row is bit-packed with numpy.packbits, using n^2 / 8 bytes instead of n^2
+    :return: An n x n boolean array, or an n x ceil(n / 8) uint8 array if packed
+    """
+    encoded = encode_names(entries)
+    size = len(entries)
+    if not packed:
+        return get_relation_rows(encoded, 0, size)
+    matrix = np.empty((size, (size + 7) // 8), dtype=np.uint8)
+    for start, stop in get_row_chunks(size):
+        matrix[start:stop] = np.packbits(get_relation_rows(encoded, start, stop), axis=1)
+    return matrix
+
+
+def get_related_pairs(entries):
+    """Return arrays i, j of the indices of all related pairs of entries with i < j, in row-major order."""
+    encoded = encode_names(entries)
+    size = len(entries)
+    indices = np.arange(size)
+    rows = []
+    columns = []
+    for start, stop in get_row_chunks(size):
+        related = get_relation_rows(encoded, start, stop) & (indices[None, :] > indices[start:stop, None])
+        i, j = np.nonzero(related)
+        rows.append(i + start)
+        columns.append(j)
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(rows), np.concatenate(columns)
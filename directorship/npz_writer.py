@@ -0,0 +1,37 @@
+
+def write_graph_to_npz(path, graph):
+    """Write the weighted adjacency matrix of a graph as a sparse COO matrix in .npz format.
+
+    Only the upper triangle (row < col) is stored. The file has the layout of scipy.sparse.save_npz,
+    so it can be loaded with scipy.sparse.load_npz, or with numpy.load as the arrays row, col, data
+    and shape. Row and column indices are the integer IDs of the node table.
+
+    :param path: Path of the .npz file to write
+    :param graph: Graph to write
+    :return: The number of linked pairs written
+    """
+    np = import_numpy()
+    size = graph.get_size()
+    rows = []
+    cols = []
+    data = []
+    for i, j, value in graph.get_edges():
+        rows.append(i)
+        cols.append(j)
+        data.append(value)
+    index_type = np.int32 if size < 2 ** 31 else np.int64
+    np.savez_compressed(path,
+                        format=b"coo",
+                        shape=np.array([size, size]),
+                        row=np.array(rows, dtype=index_type),
+                        col=np.array(cols, dtype=index_type),
+                        data=np.array(data, dtype=np.int32))
+    return len(data)
+
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Writing .npz edge lists requires numpy. Install it with 'pip install numpy'.")
+    return numpy
@@ -0,0 +1,143 @@
+"""
+Resolution of inputs too large to hold in memory, in three streaming passes.
+
+1. The rows of the input are read one at a time, and sorted by (first initial, last name, suffix), the key of
+   get_entry_sets, and then by row number, with an ExternalSorter.
+2. The sorted rows are read a few blocks at a time into a BlockTable, under their row numbers in the input, and
+   resolved with get_directors_from_entry_sets. The sets of entries of a block are then the same as in
+   get_directors, so are its directors. Each director is added to a second ExternalSorter as a record of its
+   outputs, under the key by which get_all_directors orders it.
+3. The director records are read in order, so the i-th is the director of index i of a run holding all rows in
+   memory, and the node table, incidence and aliases are written as they are read.
+
+Memory holds the firms, at most run_size rows or director records, and the blocks of a batch of about
+batch_size rows, so the largest block, rather than the input, bounds the memory needed.
+"""
+import csv
+import itertools
+from operator import itemgetter
+from .classes.entry_table import BlockTable
+from .classes.external_sorter import ExternalSorter
+from .classes.firm import Firm
+from .columnar_reader import open_input
+from .csv_reader import DEFAULT_CHUNK_SIZE
+from .entry_handler import get_directors_from_entry_sets
+from .log_writer import LOG_LEVEL_FULL
+
+# Number of rows, or director records, sorted in memory before being written to a run file
+DEFAULT_RUN_SIZE = 200000
+
+
+def sort_rows(input_path, temporary_directory, run_size=DEFAULT_RUN_SIZE):
+    """Read the rows of input_path, creating a Firm for each new firm id, and sort them by block.
+
+    :return: An ExternalSorter of ((first_init, last, suffix), row number, row values), the firm_map, and the
+        rows skipped, see CsvReader.bad_rows
+    """
+    sorter = ExternalSorter(temporary_directory, run_size)
+    with open_input(input_path) as reader:
+        firm_map = reader.firm_map
+        for row_number, values in enumerate(reader.read_values()):
+            firm_id, firm_name, full_name, first, middle, last, suffix, address = values
+            firm = firm_map.get(firm_id)
+            if firm is None:
+                firm = Firm(firm_name, firm_id, len(firm_map))
+                firm_map[firm_id] = firm
+            key = (first[0], last, "" if suffix == "0" else suffix)
+            sorter.add((key, row_number, (firm.index, full_name, first, middle, last, suffix, address)))
+    return sorter, firm_map, reader.bad_rows
+
+
+def resolve_sorted_rows(sorted_rows, firm_map, log_writer, temporary_directory, run_size=DEFAULT_RUN_SIZE,
+                        batch_size=DEFAULT_CHUNK_SIZE):
+    """Resolve the directors of rows sorted by sort_rows, batch_size rows of whole blocks at a time.
+
+    :return: An ExternalSorter of (order, record) for each director, where order is its key in get_all_directors,
+        and record is (reference, aliases, (firm index, number of entries) pairs, info, or "" if not logged in full)
+    """
+    director_sorter = ExternalSorter(temporary_directory, run_size)
+    firm_ids = list(firm_map)
+    firm_names = [firm.name for firm in firm_map.values()]
+    batch = {}
+    num_batch_rows = 0
+    for key, rows in itertools.groupby(sorted_rows, key=itemgetter(0)):
+        batch[key] = [(row_number, values) for _, row_number, values in rows]
+        num_batch_rows += len(batch[key])
+        if num_batch_rows >= batch_size:
+            resolve_batch(batch, firm_ids, firm_names, firm_map, log_writer, director_sorter)
+            batch = {}
+            num_batch_rows = 0
+    if batch:
+        resolve_batch(batch, firm_ids, firm_names, firm_map, log_writer, director_sorter)
+    return director_sorter
+
+
+def resolve_batch(batch, firm_ids, firm_names, firm_map, log_writer, director_sorter):
+    table = BlockTable(firm_ids, firm_names)
+    entry_sets = {}
+    for key, rows in batch.items():
+        entry_set = set()
+        for row_number, values in rows:
+            entry_set.add(table.append_row(row_number, *values))
+        entry_sets[key] = entry_set
+    blocks = get_directors_from_entry_sets(entry_sets, firm_map, log_writer)
+    for key, directors in blocks.items():
+        # Ordered as in get_all_directors: by name, then directors of singleton sets first, then by block
+        is_singleton = len(directors) == 1 and len(directors[0].entries) == 1
+        first_row_number = batch[key][0][0]
+        for position, d in enumerate(directors):
+            order = (d.last, d.first, d.middle, d.suffix, not is_singleton, first_row_number, position)
+            director_sorter.add((order, get_director_record(d, log_writer)))
+
+
+def get_director_record(director, log_writer):
+    """Return the reference, aliases, firm entry counts and, if logged in full, the info of a director."""
+    firm_counts = {}
+    for e in director.entries:
+        firm_index = e.firm_index
+        firm_counts[firm_index] = firm_counts.get(firm_index, 0) + 1
+    info = director.get_info() if log_writer.log_level == LOG_LEVEL_FULL else ""
+    return (director.get_adj_matrix_ref(), tuple(director.get_aliases()), tuple(sorted(firm_counts.items())),
+            info)
+
+
+def write_director_records(director_records, log_writer, nodes_path=None, incidence_path=None, aliases_path=None):
+    """Write the director records of resolve_sorted_rows, in order, to the given outputs, and their info to the
+    list of all directors of log_writer.
+
+    The node table and incidence have the layout of write_graph_nodes_to_csv and write_incidence_to_csv, and the
+    aliases that of write_aliases_to_csv.
+
+    :return: The number of directors and the number of incidence lines written
+    """
+    files = []
+    writers = {}
+    for name, path in [("nodes", nodes_path), ("incidence", incidence_path), ("aliases", aliases_path)]:
+        if path is not None:
+            file = open(path, mode='w', newline='')
+            files.append(file)
+            writers[name] = csv.writer(file)
+    if "nodes" in writers:
+        writers["nodes"].writerow(["id", "name"])
+    if "incidence" in writers:
+        writers["incidence"].writerow(["director", "firm", "entries"])
+    num_directors = 0
+    num_incidence_lines = 0
+    infos = []
+    for i, (_, (reference, aliases, firm_counts, info)) in enumerate(director_records):
+        if "nodes" in writers:
+            writers["nodes"].writerow([i, reference])
+        if "incidence" in writers:
+            writers["incidence"].writerows((i, firm_index, count) for firm_index, count in firm_counts)
+        if "aliases" in writers:
+            writers["aliases"].writerow(aliases)
+        num_directors += 1
+        num_incidence_lines += len(firm_counts)
+        infos.append(info)
+        if len(infos) == DEFAULT_CHUNK_SIZE:
+            log_writer.write_infos_to_file(log_writer.LIST_ALL_DIRECTORS, infos)
+            infos = []
+    log_writer.write_infos_to_file(log_writer.LIST_ALL_DIRECTORS, infos)
+    for file in files:
+        file.close()
+    return num_directors, num_incidence_lines
@@ -0,0 +1,149 @@
+"""
+An indexed SQLite database of the results of a run, so that e.g. the boards of a director, or the aliases merged
+into it, are found by a query rather than by scanning the logs and edge lists.
+
+Nodes are numbered as in the node tables and edge lists, and entries by their row in the input, not counting the
+header row, as in the provenance log.
+
+    firms           id, firm_id, name
+    directors       id, name, first, middle, last, suffix
+    entries         id, director, firm, full_name, first, middle, last, suffix, address
+    aliases         director, alias
+    memberships     director, firm, entries: the incidence, one row per firm of each director
+    lists           id, name, count: the lists of the logs, and the number of directors in each
+
+The records of the provenance log, when it is kept, i.e. with --log-format jsonl at the full log level:
+
+    records         id, director (null if the director was discarded, e.g. merged into another), name
+    record_entries  record, entry, in order
+    listings        position, record, list, entries: each time a director was listed, with its number of entries
+    merges          position, record, list, other, entries, other_entries, entries_after: each merge attempted of
+                    the record other into the record, in list 'merged directors' if it succeeded, with the number
+                    of entries of each at the time and of the record after the merge
+
+and, if requested, the weighted edge lists:
+
+    firm_edges, director_edges     src, dst, weight
+
+Rows are inserted in bulk, in one transaction on a new file, and indexes are created and analyzed once they have
+all been inserted. The file is written to a temporary path and then renamed, so an interrupted write leaves no database.
+"""
+import os
+import sqlite3
+from array import array
+
+TABLES = {
+    "firms": "id INTEGER PRIMARY KEY, firm_id TEXT, name TEXT",
+    "directors": "id INTEGER PRIMARY KEY, name TEXT, first TEXT, middle TEXT, last TEXT, suffix TEXT",
+    "entries": "id INTEGER PRIMARY KEY, director INTEGER, firm INTEGER, full_name TEXT, first TEXT, middle TEXT, "
+               "last TEXT, suffix TEXT, address TEXT",
+    "aliases": "director INTEGER, alias TEXT",
+    "memberships": "director INTEGER, firm INTEGER, entries INTEGER",
+    "lists": "id INTEGER PRIMARY KEY, name TEXT, count INTEGER",
+    "records": "id INTEGER PRIMARY KEY, director INTEGER, name TEXT",
+    "record_entries": "record INTEGER, entry INTEGER",
+    "listings": "position INTEGER, record INTEGER, list INTEGER, entries INTEGER",
+    "merges": "position INTEGER, record INTEGER, list INTEGER, other INTEGER, entries INTEGER, "
+              "other_entries INTEGER, entries_after INTEGER",
+}
+# Edges are stored by their (src, dst) key, in the order they are written, so that only dst needs an index
+EDGE_TABLES = {
+    "firm_edges": "src INTEGER, dst INTEGER, weight INTEGER, PRIMARY KEY (src, dst)",
+    "director_edges": "src INTEGER, dst INTEGER, weight INTEGER, PRIMARY KEY (src, dst)",
+}
+INDEXES = [
+    ("firms", "firm_id"), ("firms", "name"),
+    ("directors", "last, first"),
+    ("entries", "director"), ("entries", "firm"), ("entries", "last, first"), ("entries", "full_name"),
+    ("aliases", "director"), ("aliases", "alias"),
+    ("memberships", "director"), ("memberships", "firm"),
+    ("records", "director"),
+    ("record_entries", "record"), ("record_entries", "entry"),
+    ("listings", "record"),
+    ("merges", "record"), ("merges", "other"),
+]
+EDGE_INDEXES = [("firm_edges", "dst"), ("director_edges", "dst")]
+
+
+def get_entry_rows(table, directors):
+    """Yield the entries rows of the rows of an EntryTable, given the directors they were resolved into."""
+    director_of_row = array('i', [-1]) * len(table)
+    for i, d in enumerate(directors):
+        for e in d.entries:
+            director_of_row[e.index] = i
+    columns = [map(column.values.__getitem__, column.codes)
+               for column in [table.full_name, table.first, table.middle, table.last, table.suffix, table.address]]
+    return zip(range(len(table)), director_of_row, table.firms, *columns)
+
+
+def get_membership_rows(directors):
+    for i, d in enumerate(directors):
+        counts = {}
+        for e in d.entries:
+            firm_index = e.firm_index
+            counts[firm_index] = counts.get(firm_index, 0) + 1
+        for firm_index, count in sorted(counts.items()):
+            yield i, firm_index, count
+
+
+def write_sqlite(path, table, firms, directors, list_names, list_counts, records=None, firm_graph=None,
+                 director_graph=None):
+    """Write the results of a run to an indexed SQLite database at path, replacing any previous one.
+
+    :param table: The EntryTable of the rows of the run
+    :param firms: The firms, in order of their index
+    :param directors: The directors, in the order of the outputs
+    :param list_names: The names of the lists of the logs, and list_counts the number of directors in each
+    :param records: The completed records of a ProvenanceLogWriter, see ProvenanceLogWriter.get_records, or None
+    :param firm_graph: A Graph whose edges to write to firm_edges, or None, and likewise director_graph
+    :return: The number of rows written to each table
+    """
+    temporary_path = path + ".tmp"
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    connection = sqlite3.connect(temporary_path)
+    try:
+        # The file is new and renamed once complete, so no journal is needed
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        tables = dict(TABLES)
+        indexes = list(INDEXES)
+        if firm_graph is not None or director_graph is not None:
+            tables.update(EDGE_TABLES)
+            indexes += EDGE_INDEXES
+        for name, columns in tables.items():
+            connection.execute("CREATE TABLE {} ({}){}".format(name, columns,
+                                                               " WITHOUT ROWID" if name in EDGE_TABLES else ""))
+
+        def insert(name, rows):
+            num_columns = len(connection.execute("SELECT * FROM {} LIMIT 0".format(name)).description)
+            connection.executemany("INSERT INTO {} VALUES ({})".format(name, ", ".join("?" * num_columns)), rows)
+
+        with connection:
+            insert("firms", ((f.index, f.firm_id, f.name) for f in firms))
+            insert("directors", ((i, d.get_adj_matrix_ref(), d.first, d.middle, d.last, d.suffix)
+                                 for i, d in enumerate(directors)))
+            insert("entries", get_entry_rows(table, directors))
+            insert("aliases", ((i, alias) for i, d in enumerate(directors) for alias in sorted(d.get_aliases())))
+            insert("memberships", get_membership_rows(directors))
+            insert("lists", zip(range(len(list_names)), list_names, list_counts))
+            if records is not None:
+                insert("records", ((r["id"], r["director"], r["name"]) for r in records))
+                insert("record_entries", ((r["id"], entry) for r in records for entry in r["entries"]))
+                insert("listings", ((position, r["id"], list_number, num_entries)
+                                    for r in records for position, list_number, num_entries in r["lists"]))
+                insert("merges", ((merge[0], r["id"], *merge[1:]) for r in records for merge in r["merges"]))
+            if firm_graph is not None:
+                insert("firm_edges", firm_graph.get_edges())
+            if director_graph is not None:
+                insert("director_edges", director_graph.get_edges())
+            for table_name, columns in indexes:
+                connection.execute("CREATE INDEX {0}_{1} ON {0} ({2})".format(
+                    table_name, columns.replace(", ", "_"), columns))
+            # Statistics of the indexes, so that the query planner picks the most selective one
+            connection.execute("ANALYZE")
+        counts = {name: connection.execute("SELECT COUNT(*) FROM {}".format(name)).fetchone()[0] for name in tables}
+    finally:
+        connection.close()
+    os.replace(temporary_path, path)
+    return counts
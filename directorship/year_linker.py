@@ -0,0 +1,106 @@
+import csv
+from .classes.resolution_state import ResolutionState
+from .entry_handler import get_all_directors, compare_entries_with_first_and_middle_init_and_same_last_and_suffix
+from .log_writer import LogWriter, LOG_LEVEL_NONE
+
+
+def load_directors(output_directory):
+    """Return the directors of a run, in the order of its output, from the state saved in its output directory."""
+    state = ResolutionState.load(output_directory + "state.pickle")
+    return get_all_directors(state.blocks, state.get_firm_map(), LogWriter(output_directory, LOG_LEVEL_NONE))
+
+
+def get_director_blocks(directors):
+    """Return a mapping from (first_init, last, suffix) to the indices of the directors with those values."""
+    blocks = {}
+    for i, d in enumerate(directors):
+        k = (d.first_init, d.last, d.suffix)
+        if k not in blocks:
+            blocks[k] = []
+        blocks[k].append(i)
+    return blocks
+
+
+def link_directors(directors, other_directors):
+    """Link the directors of one year to those of another by name.
+
+    Candidates are only the pairs of directors in the same block of (first_init, last, suffix), so the time
+    taken is the sum of the products of the sizes of the shared blocks. Two directors are related if their
+    names are related by the name relation used to match entries within a year. Pairs with the same First Name
+    and Middle Name are linked first, and then the remaining related pairs, in each case only if each director
+    of the pair is related to no other remaining director of the other year, so ambiguous names are left
+    unlinked.
+
+    :param directors: List of Directors of one year
+    :param other_directors: List of Directors of another year
+    :return: The list of linked index pairs (i, j), in order of i, and the number of directors of the first
+        year left unlinked although related to some director of the other year
+    """
+    other_blocks = get_director_blocks(other_directors)
+    links = []
+    num_ambiguous = 0
+    for k, block in get_director_blocks(directors).items():
+        other_block = other_blocks.get(k)
+        if other_block is None:
+            continue
+        related = {}
+        for i in block:
+            d = directors[i]
+            related[i] = [j for j in other_block
+                          if compare_entries_with_first_and_middle_init_and_same_last_and_suffix(d, other_directors[j])]
+        exact = {i: [j for j in js if (directors[i].first, directors[i].middle) ==
+                     (other_directors[j].first, other_directors[j].middle)] for i, js in related.items()}
+        block_links = get_unique_pairs(exact)
+        linked = {i for i, _ in block_links}
+        other_linked = {j for _, j in block_links}
+        remaining = {i: [j for j in js if j not in other_linked] for i, js in related.items() if i not in linked}
+        block_links += get_unique_pairs(remaining)
+        links += block_links
+        num_ambiguous += sum(1 for js in related.values() if js) - len(block_links)
+    links.sort()
+    return links, num_ambiguous
+
+
+def get_unique_pairs(candidates):
+    """Return the pairs (i, j) where j is the only candidate of i, and i the only index with candidate j."""
+    counts = {}
+    for js in candidates.values():
+        for j in js:
+            counts[j] = counts.get(j, 0) + 1
+    return [(i, js[0]) for i, js in candidates.items() if len(js) == 1 and counts[js[0]] == 1]
+
+
+def get_panel_ids(years_directors):
+    """Assign each director of each year a panel id, shared by directors linked across consecutive years.
+
+    Ids are given in order of year and then of director index, so they are the same for the same runs.
+
+    :param years_directors: A list of the lists of Directors of each year, in order of year
+    :return: A list of the lists of panel ids of the directors of each year, and a list of the number of
+        linked and ambiguous directors between each year and the next
+    """
+    panel_ids = [list(range(len(years_directors[0])))]
+    next_id = len(years_directors[0])
+    link_counts = []
+    for directors, next_directors in zip(years_directors, years_directors[1:]):
+        links, num_ambiguous = link_directors(next_directors, directors)
+        link_counts.append((len(links), num_ambiguous))
+        previous_ids = panel_ids[-1]
+        ids = [None] * len(next_directors)
+        for i, j in links:
+            ids[i] = previous_ids[j]
+        for i in range(len(ids)):
+            if ids[i] is None:
+                ids[i] = next_id
+                next_id += 1
+        panel_ids.append(ids)
+    return panel_ids, link_counts
+
+
+def write_panel_to_csv(path, years, years_directors, panel_ids):
+    with open(path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["panel_id", "year", "director_id", "name"])
+        for year, directors, ids in zip(years, years_directors, panel_ids):
+            for i, (d, panel_id) in enumerate(zip(directors, ids)):
+                writer.writerow([panel_id, year, i, d.get_adj_matrix_ref()])
@@ -4,6 +4,11 @@ setup(
     name="directorship",
     version="0.1.0",
     packages=find_packages(),
+    extras_require={
+        "numpy": ["numpy"],
+        "analyze": ["numpy", "scipy"],
+        "columnar": ["pyarrow"],
+    },
     entry_points={
         "console_scripts": [
             "directorship = directorship.__main__:main",
@@ -1,2 +1,610 @@
+import collections
+import csv
+import json
+import random
+import sqlite3
 import pytest
+from directorship.classes.director import Director
+from directorship.log_writer import LogWriter, ProvenanceLogWriter
+from directorship.log_renderer import render_logs
+from directorship.classes.entry_table import EntryTable, STRING_COLUMNS
+from directorship.classes.firm import Firm
+from directorship.classes.graph import Graph
+from directorship.classes.resolution_state import ResolutionState
+from directorship import entry_handler, name_kernel, ingest_cache
+from directorship.year_linker import link_directors, get_panel_ids
+from directorship.graph_analysis import load_run, analyze_run
+from directorship.directorship import parse_args, main, parse_batch_args, batch_main
+from directorship.entry_handler import get_directors, update_directors, link_directors_to_firms, get_equivalence_classes, \
+    compare_entries_with_first_and_middle_init_and_same_last_and_suffix
+from directorship.csv_reader import CsvReader, read_csv, parse_csv, TOO_FEW_COLUMNS, EMPTY_FIRST_NAME, \
+    EMPTY_MIDDLE_NAME
+from directorship.columnar_reader import ColumnarReader, parse_input
+from directorship.csv_writer import write_graph_to_csv, write_graph_to_csv_sharded, write_id_graph_to_csv, \
+    write_graph_nodes_to_csv
+from benchmarks.mega_block import get_pairwise_equivalence_classes
 
+
+def build_directors_and_firms(memberships, num_firms):
+    firms = [Firm("Firm {}".format(i), "F{}".format(i), i) for i in range(num_firms)]
+    table = EntryTable()
+    directors = []
+    for k, firm_indices in enumerate(memberships):
+        name = "D{}".format(k)
+        entry = table.append(firms[firm_indices[0]].firm_id, "", name, name, "0", "Last", "0", "")
+        director = Director(*entry.get_director_constructor())
+        for i in firm_indices:
+            director.add_firm(firms[i])
+        directors.append(director)
+    link_directors_to_firms(directors, firms)
+    return directors, firms
+
+
+def test_director_caches_are_cleared_by_new_entries():
+    table = EntryTable()
+    director = Director(*table.append("F0", "", "J Smith", "J", "0", "Smith", "0", "").get_director_constructor())
+    assert director.get_adj_matrix_ref() == "J Smith"
+    assert director.get_aliases() == {"J Smith"}
+    info = director.get_info()
+    director.associate_with_entry(table.append("F1", "", "John Smith", "John", "0", "Smith", "0", ""))
+    assert director.get_adj_matrix_ref() == "John Smith"
+    assert director.get_aliases() == {"J Smith", "John Smith"}
+    assert director.get_info() != info and director.get_info().startswith("John Smith")
+
+
+def write_input_csv(path, rows):
+    with open(path, mode='w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["firm_name", "first", "middle", "last", "suffix", "firm_id", "full_name", "address"])
+        for firm_id, first, middle, last, suffix in rows:
+            full_name = " ".join(x for x in [first, middle, last, suffix] if x != "0")
+            writer.writerow(["Firm " + firm_id, first, middle, last, suffix, firm_id, full_name, "1 Main St"])
+
+
+def all_pairs_edges(graph):
+    edges = []
+    for i in range(graph.get_size() - 1):
+        for j in range(i + 1, graph.get_size()):
+            value = graph.get_value(i, j)
+            if value > 0:
+                edges.append((i, j, value))
+    return edges
+
+
+@pytest.mark.parametrize("memberships", [
+    [[0], [1], [2]],
+    [[0, 1], [0, 1], [1, 2], [3]],
+    [[0, 1, 2], [2, 3], [0, 3, 4], [4], [1, 4], [0, 1, 2, 3, 4]],
+])
+def test_projection_matches_all_pairs(memberships):
+    directors, firms = build_directors_and_firms(memberships, 5)
+    for objects in (directors, firms):
+        graph = Graph(objects)
+        assert list(graph.get_edges()) == all_pairs_edges(graph)
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_sharded_edge_list_matches_serial(tmp_path, workers):
+    directors, _ = build_directors_and_firms([[0, 1, 2], [2, 3], [0, 3, 4], [4], [1, 4], [0, 1, 2, 3, 4]], 5)
+    graph = Graph(directors)
+    write_graph_to_csv(str(tmp_path / "serial.csv"), graph)
+    shards = write_graph_to_csv_sharded(str(tmp_path / "sharded.csv"), graph, workers)
+    assert (tmp_path / "serial.csv").read_bytes() == (tmp_path / "sharded.csv").read_bytes()
+    assert sum(s[2] for s in shards) == sum(value for _, _, value in graph.get_edges())
+
+
+def test_id_edge_list_expands_to_edge_list(tmp_path):
+    directors, _ = build_directors_and_firms([[0, 1, 2], [2, 3], [0, 3, 4], [4], [1, 4], [0, 1, 2, 3, 4]], 5)
+    graph = Graph(directors)
+    write_graph_to_csv(str(tmp_path / "edges.csv"), graph)
+    write_graph_nodes_to_csv(str(tmp_path / "nodes.csv"), graph)
+    write_id_graph_to_csv(str(tmp_path / "ids.csv"), graph)
+    with open(tmp_path / "nodes.csv", newline='') as f:
+        names = {row["id"]: row["name"] for row in csv.DictReader(f)}
+    with open(tmp_path / "ids.csv", newline='') as f:
+        expanded = [[names[row["src"]], names[row["dst"]]]
+                    for row in csv.DictReader(f) for _ in range(int(row["weight"]))]
+    with open(tmp_path / "edges.csv", newline='') as f:
+        assert list(csv.reader(f)) == expanded
+
+
+def test_csv_reader_streams_chunks(tmp_path):
+    rows = [("F{}".format(i % 4), "John", "0", "Smith{}".format(i), "0") for i in range(10)]
+    write_input_csv(tmp_path / "input.csv", rows)
+    with CsvReader(str(tmp_path / "input.csv"), chunk_size=4) as reader:
+        chunks = list(reader.read_chunks())
+    assert reader.csv_file is None
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert sorted(reader.firm_map) == ["F0", "F1", "F2", "F3"]
+    entries, firm_map = read_csv(str(tmp_path / "input.csv"))
+    assert [e.last for chunk in chunks for e in chunk] == [e.last for e in entries]
+
+
+def test_parse_csv_in_parallel(tmp_path):
+    rows = [("F{}".format(i % 7), "John", "0", "Smith{}".format(i % 50), "0") for i in range(300)]
+    write_input_csv(tmp_path / "input.csv", rows)
+    with open(tmp_path / "input.csv", newline='') as f:
+        lines = list(csv.reader(f))
+    # A firm name with quoted newlines and commas, and rows with too few columns
+    lines[5][0] = 'Firm "A",\nof\nBoston'
+    lines[40] = lines[40][:3]
+    lines.insert(100, [])
+    with open(tmp_path / "input.csv", 'w', newline='') as f:
+        csv.writer(f).writerows(lines)
+    serial, serial_bad_rows = parse_csv(str(tmp_path / "input.csv"))
+    parallel, parallel_bad_rows = parse_csv(str(tmp_path / "input.csv"), workers=3)
+    assert serial_bad_rows == parallel_bad_rows == [(43, 3, TOO_FEW_COLUMNS), (103, 0, TOO_FEW_COLUMNS)]
+    assert len(parallel) == len(serial) == 299
+    assert [e.get_director_constructor()[:4] + [e.firm_id, e.firm_name, e.full_name] for e in parallel] == \
+           [e.get_director_constructor()[:4] + [e.firm_id, e.firm_name, e.full_name] for e in serial]
+    assert parallel.firm_ids == serial.firm_ids
+
+
+def test_parse_csv_in_parallel_with_stray_quote(tmp_path, monkeypatch):
+    # Ranges of a few bytes, so that every newline that looks like a row boundary ends one
+    monkeypatch.setattr("directorship.csv_reader.RANGES_PER_WORKER", 1000)
+    rows = [("F{}".format(i % 7), "John", "0", "Smith{}".format(i % 50), "0") for i in range(300)]
+    write_input_csv(tmp_path / "input.csv", rows)
+    with open(tmp_path / "input.csv", newline='') as f:
+        lines = list(csv.reader(f))
+    # A quote within an unquoted last name, read as is by the csv module, then a firm name with quoted newlines,
+    # the first of which has an even number of quotes before it within its range
+    lines[5][3] = "O-Brien"
+    lines[6][0] = 'Firm "A",\nof\nBoston'
+    with open(tmp_path / "input.csv", 'w', newline='') as f:
+        csv.writer(f).writerows(lines)
+    (tmp_path / "input.csv").write_text((tmp_path / "input.csv").read_text().replace("O-Brien", 'O"Brien'))
+    serial, serial_bad_rows = parse_csv(str(tmp_path / "input.csv"))
+    parallel, parallel_bad_rows = parse_csv(str(tmp_path / "input.csv"), workers=2)
+    assert serial_bad_rows == parallel_bad_rows == []
+    assert [e.get_director_constructor()[:4] + [e.firm_id, e.firm_name] for e in parallel] == \
+           [e.get_director_constructor()[:4] + [e.firm_id, e.firm_name] for e in serial]
+    assert serial[4].last == 'O"Brien' and serial[5].firm_name == 'Firm "A",\nof\nBoston'
+
+
+@pytest.mark.parametrize("mode", ["csv", "read workers", "out of core", "parquet"])
+def test_rows_with_empty_names_are_skipped(tmp_path, mode):
+    write_random_input_csv(tmp_path / "input.csv", 200)
+    with open(tmp_path / "input.csv", newline='') as f:
+        lines = list(csv.reader(f))
+    lines[9][1] = ""
+    lines[19][2] = ""
+    with open(tmp_path / "input.csv", 'w', newline='') as f:
+        csv.writer(f).writerows(lines)
+    input_file = "input.csv"
+    arguments = ["--indir", str(tmp_path), "--outdir", str(tmp_path), "--yes", "--log-level", "none", "-b"]
+    if mode == "read workers":
+        arguments += ["--read-workers", "2"]
+    elif mode == "out of core":
+        arguments += ["--out-of-core"]
+    elif mode == "parquet":
+        pa = pytest.importorskip("pyarrow")
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(pa.table({name: [row[i] for row in lines[1:]] for i, name in enumerate(lines[0])}),
+                                    tmp_path / "input.parquet")
+        input_file = "input.parquet"
+    result = main(parse_args([input_file, "output"] + arguments))
+    assert result["rows"] == 198
+    with open(tmp_path / "output" / "bad_rows.csv", newline='') as f:
+        assert [(row["line"], row["reason"]) for row in csv.DictReader(f)] == \
+               [("10", EMPTY_FIRST_NAME), ("20", EMPTY_MIDDLE_NAME)]
+
+
+def random_block(rng, size):
+    table = EntryTable()
+    for _ in range(size):
+        first = rng.choice(["J", "John", "Jack", "Jacob"])
+        middle = rng.choice(["A", "Adam", "Abe"])
+        table.append("F1", "", "{} {} Smith".format(first, middle), first, middle, "Smith", "0", "")
+    return list(table)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_equivalence_classes_match_pairwise(seed):
+    rng = random.Random(seed)
+    entries = random_block(rng, rng.randint(1, 12))
+    expected = get_pairwise_equivalence_classes(entries)
+    result = get_equivalence_classes(entries)
+    if expected is None:
+        assert result is None
+    else:
+        assert sorted(sorted(e.index for e in c) for c in result) == \
+            sorted(sorted(e.index for e in c) for c in expected)
+
+
+def random_names(rng, size):
+    table = EntryTable()
+    for _ in range(size):
+        first = rng.choice(["J", "John", "Jack", "W", "William", "Will"])
+        middle = rng.choice(["0", "A", "Adam", "Abe", "B", "Ben"])
+        table.append("F1", "", first, first, middle, "Smith", "0", "")
+    return list(table)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_name_kernel_matches_comparison_functions(seed, monkeypatch):
+    np = pytest.importorskip("numpy")
+    monkeypatch.setattr(name_kernel, "CHUNK_ELEMENTS", 1000)
+    rng = random.Random(seed)
+    entries = random_names(rng, rng.randint(1, 150))
+    expected = np.array([[compare_entries_with_first_and_middle_init_and_same_last_and_suffix(e1, e2)
+                          for e2 in entries] for e1 in entries])
+    assert (name_kernel.get_relation_matrix(entries) == expected).all()
+    packed = name_kernel.get_relation_matrix(entries, packed=True)
+    assert (np.unpackbits(packed, axis=1, count=len(entries)).astype(bool) == expected).all()
+    rows, columns = name_kernel.get_related_pairs(entries)
+    assert list(zip(rows.tolist(), columns.tolist())) == \
+        [(i, j) for i in range(len(entries)) for j in range(i + 1, len(entries)) if expected[i, j]]
+
+
+def test_vectorized_equivalence_classes_match(monkeypatch):
+    pytest.importorskip("numpy")
+    rng = random.Random(0)
+    for _ in range(20):
+        entries = random_block(rng, rng.randint(1, 100))
+        monkeypatch.setattr(entry_handler, "VECTORIZED_COMPARISON_THRESHOLD", 10 ** 9)
+        expected = get_equivalence_classes(entries)
+        monkeypatch.setattr(entry_handler, "VECTORIZED_COMPARISON_THRESHOLD", 0)
+        result = get_equivalence_classes(entries)
+        assert (result is None) == (expected is None)
+        if expected is not None:
+            assert sorted(sorted(e.index for e in c) for c in result) == \
+                sorted(sorted(e.index for e in c) for c in expected)
+
+
+def resolve_input(path, log_directory, jobs, log_level="full", log_writer_class=LogWriter):
+    log_directory.mkdir()
+    log_writer = log_writer_class(str(log_directory) + "/", log_level)
+    log_writer.initialize_text_files()
+    Director.set_log_writer(log_writer)
+    with CsvReader(str(path)) as reader:
+        directors = get_directors(reader.read_entries(), reader.firm_map, log_writer, jobs)
+    log_writer.write_counts()
+    log_writer.close()
+    return directors
+
+
+def write_random_input_csv(path, num_rows, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(num_rows):
+        first = rng.choice(["J", "John", "James", "W", "William"])
+        middle = rng.choice(["0", "0", "A", "Adam", "B", "Ben"])
+        last = rng.choice(["Smith", "Jones", "Brown", "Clark"])
+        rows.append(("F{}".format(rng.randrange(60)), first, middle, last, rng.choice(["0", "0", "Jr"])))
+    write_input_csv(path, rows)
+
+
+def test_parallel_resolution_matches_serial(tmp_path):
+    write_random_input_csv(tmp_path / "input.csv", 400)
+    serial = resolve_input(tmp_path / "input.csv", tmp_path / "serial", 1)
+    parallel = resolve_input(tmp_path / "input.csv", tmp_path / "parallel", 3)
+    assert [(str(d), [e.index for e in d.entries], list(d.firms)) for d in serial] == \
+        [(str(d), [e.index for e in d.entries], list(d.firms)) for d in parallel]
+    for log_file in (tmp_path / "serial").iterdir():
+        assert log_file.read_bytes() == (tmp_path / "parallel" / log_file.name).read_bytes()
+
+
+def test_firms_are_linked_through_merged_directors(tmp_path):
+    # John Smith of F2 is merged into John Adam Smith of F1, so F1 and F2 share a director, as F2 and F3 do
+    write_input_csv(tmp_path / "input.csv", [("F1", "John", "Adam", "Smith", "0"), ("F2", "John", "0", "Smith", "0"),
+                                             ("F2", "Mary", "Ann", "Jones", "0"), ("F3", "Mary", "Ann", "Jones", "0")])
+    log_writer = LogWriter(str(tmp_path) + "/", "none")
+    Director.set_log_writer(log_writer)
+    with CsvReader(str(tmp_path / "input.csv")) as reader:
+        directors = get_directors(reader.read_entries(), reader.firm_map, log_writer)
+    assert sorted(str(d) for d in directors) == ["John Adam Smith", "Mary Ann Jones"]
+    graph = Graph(list(reader.firm_map.values()))
+    references = graph.get_references()
+    assert [(references[i], references[j], value) for i, j, value in graph.get_edges()] == \
+        [("F1", "F2", 1), ("F2", "F3", 1)]
+
+
+def test_log_levels(tmp_path):
+    write_random_input_csv(tmp_path / "input.csv", 400)
+    full = resolve_input(tmp_path / "input.csv", tmp_path / "full", 1)
+    counts = resolve_input(tmp_path / "input.csv", tmp_path / "counts", 1, "counts")
+    none = resolve_input(tmp_path / "input.csv", tmp_path / "none", 1, "none")
+    assert [str(d) for d in full] == [str(d) for d in counts] == [str(d) for d in none]
+    assert not list((tmp_path / "none").iterdir())
+    for log_file in (tmp_path / "full").iterdir():
+        full_text = log_file.read_text()
+        counts_text = (tmp_path / "counts" / log_file.name).read_text()
+        assert counts_text == full_text[:full_text.index("\n\n") + 2] + full_text[full_text.rindex("\nCount: "):]
+
+
+def test_log_writer_raises_error_of_writer_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr("directorship.log_writer.BUFFER_SIZE", 0)
+    log_writer = LogWriter(str(tmp_path) + "/")
+    log_writer.initialize_text_files()
+    log_writer.write_to_file(log_writer.LIST_ALL_DIRECTORS, "José Smith\n")
+    # A lone surrogate cannot be encoded, so the thread fails with more pieces to come than its queue holds
+    with pytest.raises(UnicodeEncodeError):
+        for _ in range(100):
+            log_writer.write_to_file(log_writer.LIST_ALL_DIRECTORS, "Jos\ud800 Smith\n")
+        log_writer.close()
+    with pytest.raises(UnicodeEncodeError):
+        log_writer.close()
+    assert log_writer.thread is None
+    assert (tmp_path / "all directors.txt").read_text(encoding='utf-8').endswith("José Smith\n")
+
+
+def normalize_log(text):
+    # aliases and addresses are listed in set order
+    lines = []
+    for line in text.split("\n"):
+        if line.startswith("\taliases: ") or line.startswith("\taddresses: "):
+            key, _, values = line.partition(": ")
+            line = key + ": " + ", ".join(sorted(values.split(", ")))
+        lines.append(line)
+    return lines
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_rendered_provenance_log_matches_text_logs(tmp_path, jobs):
+    write_random_input_csv(tmp_path / "input.csv", 600)
+    resolve_input(tmp_path / "input.csv", tmp_path / "text", 1)
+    resolve_input(tmp_path / "input.csv", tmp_path / "jsonl", jobs, log_writer_class=ProvenanceLogWriter)
+    paths = render_logs(str(tmp_path / "jsonl" / "provenance.jsonl"), str(tmp_path / "rendered") + "/",
+                        [str(tmp_path / "input.csv")])
+    assert len(paths) == len(list((tmp_path / "text").iterdir()))
+    for log_file in (tmp_path / "text").iterdir():
+        rendered_text = (tmp_path / "rendered" / log_file.name).read_text()
+        assert normalize_log(rendered_text) == normalize_log(log_file.read_text())
+
+
+def test_incremental_resolution_matches_full_run(tmp_path):
+    write_random_input_csv(tmp_path / "first.csv", 300, seed=1)
+    write_random_input_csv(tmp_path / "second.csv", 100, seed=2)
+    second_rows = (tmp_path / "second.csv").read_text().split("\n", 1)[1]
+    (tmp_path / "all.csv").write_text((tmp_path / "first.csv").read_text() + second_rows)
+    log_writer = LogWriter(str(tmp_path) + "/", "none")
+    Director.set_log_writer(log_writer)
+    with CsvReader(str(tmp_path / "all.csv")) as reader:
+        directors = get_directors(reader.read_entries(), reader.firm_map, log_writer)
+    firms = list(reader.firm_map.values())
+
+    blocks = {}
+    with CsvReader(str(tmp_path / "first.csv")) as reader:
+        get_directors(reader.read_entries(), reader.firm_map, log_writer, blocks=blocks)
+    ResolutionState(reader.table, blocks, ["first.csv"]).save(str(tmp_path / "state.pickle"))
+    state = ResolutionState.load(str(tmp_path / "state.pickle"))
+    with CsvReader(str(tmp_path / "second.csv"), table=state.table, firm_map=state.get_firm_map()) as reader:
+        updated_directors = update_directors(state.blocks, reader.read_entries(), reader.firm_map, log_writer)
+    updated_firms = list(reader.firm_map.values())
+
+    assert [d.get_record() for d in updated_directors] == [d.get_record() for d in directors]
+    assert all_pairs_edges(Graph(updated_directors)) == all_pairs_edges(Graph(directors))
+    assert all_pairs_edges(Graph(updated_firms)) == all_pairs_edges(Graph(firms))
+
+
+def test_ingest_cache_round_trip(tmp_path, monkeypatch):
+    write_random_input_csv(tmp_path / "input.csv", 200)
+    cache_path = str(tmp_path / "cache.bin")
+    table, _, from_cache = ingest_cache.read_input_with_cache(str(tmp_path / "input.csv"), cache_path)
+    cached_table, _, from_cache_again = ingest_cache.read_input_with_cache(str(tmp_path / "input.csv"), cache_path)
+    assert not from_cache and from_cache_again
+    assert [e.get_director_constructor()[:4] + [e.firm_id, e.full_name, e.address] for e in cached_table] == \
+           [e.get_director_constructor()[:4] + [e.firm_id, e.full_name, e.address] for e in table]
+    assert list(cached_table.get_firm_map()) == list(table.get_firm_map())
+    # Changing the column indices invalidates the cache
+    monkeypatch.setattr("directorship.csv_reader.ADDRESS_COL", 6)
+    assert ingest_cache.read_table(cache_path, ingest_cache.get_cache_key(str(tmp_path / "input.csv"))) is None
+
+
+def test_columnar_batch_of_skipped_rows(tmp_path, monkeypatch):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+    monkeypatch.setattr("directorship.columnar_reader.PARSE_BATCH_SIZE", 10)
+    write_random_input_csv(tmp_path / "input.csv", 30)
+    with open(tmp_path / "input.csv", newline='') as f:
+        rows = list(csv.reader(f))
+    # Every row of the second row group has an empty First Name, so nothing is left of its batch
+    for row in rows[11:21]:
+        row[1] = ""
+    with open(tmp_path / "input.csv", 'w', newline='') as f:
+        csv.writer(f).writerows(rows)
+    pyarrow.parquet.write_table(pa.table({name: [row[i] for row in rows[1:]] for i, name in enumerate(rows[0])}),
+                                tmp_path / "input.parquet", row_group_size=10)
+    table, bad_rows = parse_input(str(tmp_path / "input.parquet"))
+    csv_table, csv_bad_rows = parse_csv(str(tmp_path / "input.csv"))
+    assert bad_rows == csv_bad_rows == [(line_number, 8, EMPTY_FIRST_NAME) for line_number in range(12, 22)]
+    assert len(table) == 20
+    assert (table.firms, table.flags, table.first.codes) == (csv_table.firms, csv_table.flags, csv_table.first.codes)
+
+
+@pytest.mark.parametrize("input_format", ["parquet", "feather"])
+def test_columnar_input_matches_csv(tmp_path, monkeypatch, input_format):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.feather
+    import pyarrow.parquet
+    monkeypatch.setattr("directorship.columnar_reader.PARSE_BATCH_SIZE", 64)
+    write_random_input_csv(tmp_path / "input.csv", 400)
+    with open(tmp_path / "input.csv", newline='') as f:
+        rows = list(csv.reader(f))
+    columnar_table = pa.table({name: [row[i] for row in rows[1:]] for i, name in enumerate(rows[0])})
+    if input_format == "parquet":
+        pyarrow.parquet.write_table(columnar_table, tmp_path / "input.parquet", row_group_size=100)
+    else:
+        pyarrow.feather.write_feather(columnar_table, tmp_path / "input.feather", chunksize=100)
+
+    table, bad_rows = parse_input(str(tmp_path / ("input." + input_format)))
+    csv_table, _ = parse_csv(str(tmp_path / "input.csv"))
+    # The file is closed, with its memory map, when reading is done
+    with ColumnarReader(str(tmp_path / ("input." + input_format))) as reader:
+        source = reader.parquet_file or reader.feather_source
+        assert sum(len(columns[0]) for columns in reader.read_batches()) == 400
+    assert source.closed and reader.parquet_file is reader.feather_source is reader.feather_table is None
+    assert bad_rows == []
+    assert (table.firm_ids, table.firm_names, table.firms, table.flags) == \
+           (csv_table.firm_ids, csv_table.firm_names, csv_table.firms, csv_table.flags)
+    for name in STRING_COLUMNS:
+        assert (getattr(table, name).values, getattr(table, name).codes) == \
+               (getattr(csv_table, name).values, getattr(csv_table, name).codes)
+
+    arguments = ["--indir", str(tmp_path), "--outdir", str(tmp_path), "--yes", "--log-level", "none", "-a", "-b",
+                 "--cache"]
+    main(parse_args(["input.csv", "csv"] + arguments))
+    main(parse_args(["input." + input_format, "columnar"] + arguments))
+    for name in ["incidence.csv", "directors_nodes.csv", "firms_nodes.csv", "aliases.csv"]:
+        assert (tmp_path / "columnar" / name).read_text() == (tmp_path / "csv" / name).read_text()
+
+
+def test_cache_and_state_are_opt_in(tmp_path):
+    write_random_input_csv(tmp_path / "input.csv", 100)
+    arguments = ["--indir", str(tmp_path), "--outdir", str(tmp_path), "--yes", "--log-level", "none", "-b"]
+    main(parse_args(["input.csv", "output", "--cache", "--save-state"] + arguments))
+    assert (tmp_path / "output" / "ingest_cache.bin").is_file() and (tmp_path / "output" / "state.pickle").is_file()
+    incidence = (tmp_path / "output" / "incidence.csv").read_text()
+    (tmp_path / "output" / "ingest_cache.bin").unlink()
+    # A default run writes no cache, and removes the state of the previous run, which no longer matches
+    main(parse_args(["input.csv", "output"] + arguments))
+    assert not (tmp_path / "output" / "ingest_cache.bin").exists()
+    assert not (tmp_path / "output" / "state.pickle").exists()
+    assert (tmp_path / "output" / "incidence.csv").read_text() == incidence
+
+
+def test_batch_matches_single_runs(tmp_path):
+    indir = tmp_path / "input"
+    indir.mkdir()
+    write_random_input_csv(indir / "1920_data.csv", 300, seed=1)
+    write_random_input_csv(indir / "1940_data.csv", 200, seed=2)
+    batch_main(parse_batch_args(["--indir", str(indir), "--outdir", str(tmp_path / "batch"), "-f", "-d", "--yes",
+                                 "--processes", "2", "--log-level", "none"]))
+    with open(tmp_path / "batch" / "batch_summary.csv", newline='') as f:
+        summary = list(csv.DictReader(f))
+    assert [(row["output"], row["status"], row["rows"]) for row in summary] == [("1920", "ok", "300"),
+                                                                             ("1940", "ok", "200")]
+    result = main(parse_args(["1940_data.csv", "single", "--indir", str(indir), "--outdir", str(tmp_path),
+                              "-f", "-d", "--yes", "--log-level", "none"]))
+    assert result["directors"] == int(summary[1]["directors"])
+    for name in ["firms_edge_list.csv", "directors_edge_list.csv"]:
+        assert (tmp_path / "single" / name).read_text() == (tmp_path / "batch" / "1940" / name).read_text()
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_metrics_of_run(tmp_path, jobs):
+    indir = tmp_path / "input"
+    indir.mkdir()
+    write_random_input_csv(indir / "input.csv", 300)
+    metrics_path = tmp_path / "metrics.json"
+    result = main(parse_args(["input.csv", "output", "--indir", str(indir), "--outdir", str(tmp_path), "-f", "-d",
+                              "-a", "--yes", "--jobs", str(jobs), "--metrics", str(metrics_path)]))
+    with open(metrics_path) as f:
+        metrics = json.load(f)
+    for stage in ["read", "block", "resolve", "log", "firm graph", "director graph", "aliases"]:
+        assert metrics["stages"][stage]["calls"] == 1
+        # The growth of the peak within each stage, rather than the peak of the process
+        assert 0 <= metrics["stages"][stage]["peak_rss_growth_mb"] <= metrics["stages"][stage]["process_peak_rss_mb"]
+    counters = metrics["counters"]
+    assert counters["directors"] == result["directors"] == counters["log.all directors"]
+    assert sum(metrics["histograms"]["block_size"].values()) == counters["blocks"]
+    with open(tmp_path / "output" / "directors_edge_list.csv") as f:
+        assert counters["director_edges_written"] == sum(1 for _ in f)
+
+
+def test_incidence_gives_projections(tmp_path):
+    indir = tmp_path / "input"
+    indir.mkdir()
+    write_random_input_csv(indir / "input.csv", 300)
+    result = main(parse_args(["input.csv", "output", "--indir", str(indir), "--outdir", str(tmp_path), "--yes",
+                              "--log-level", "none", "-b", "-d", "-f", "--edge-format", "ids"]))
+    with open(tmp_path / "output" / "incidence.csv", newline='') as f:
+        incidence = [(int(row["director"]), int(row["firm"]), int(row["entries"])) for row in csv.DictReader(f)]
+    assert sum(entries for _, _, entries in incidence) == result["rows"]
+    for name, key, other in [("directors", 0, 1), ("firms", 1, 0)]:
+        members = collections.defaultdict(list)
+        for link in incidence:
+            members[link[other]].append(link[key])
+        pairs = collections.Counter((i, j) for nodes in members.values() for i in nodes for j in nodes if i < j)
+        with open(tmp_path / "output" / "{}_id_edge_list.csv".format(name), newline='') as f:
+            edges = {(int(row["src"]), int(row["dst"])): int(row["weight"]) for row in csv.DictReader(f)}
+        assert dict(pairs) == edges
+
+
+@pytest.mark.parametrize("max_open_runs", [256, 2])
+def test_out_of_core_matches_in_memory(tmp_path, monkeypatch, max_open_runs):
+    monkeypatch.setattr("directorship.classes.external_sorter.MAX_OPEN_RUNS", max_open_runs)
+    indir = tmp_path / "input"
+    indir.mkdir()
+    write_random_input_csv(indir / "input.csv", 400)
+    arguments = ["--indir", str(indir), "--outdir", str(tmp_path), "--yes", "--log-level", "none", "-a", "-b"]
+    main(parse_args(["input.csv", "in_memory"] + arguments))
+    result = main(parse_args(["input.csv", "out_of_core"] + arguments + ["--out-of-core", "--run-size", "50",
+                                                                         "--chunk-size", "20"]))
+    assert result["rows"] == 400
+    for name in ["incidence.csv", "directors_nodes.csv", "firms_nodes.csv", "aliases.csv"]:
+        assert (tmp_path / "out_of_core" / name).read_text() == (tmp_path / "in_memory" / name).read_text()
+
+
+def test_sqlite_store_matches_outputs(tmp_path):
+    write_random_input_csv(tmp_path / "input.csv", 400)
+    db_path = str(tmp_path / "run.db")
+    result = main(parse_args(["input.csv", "output", "--indir", str(tmp_path), "--outdir", str(tmp_path), "--yes",
+                              "--log-format", "jsonl", "-b", "-f", "--edge-format", "ids", "--sqlite", db_path,
+                              "--sqlite-edges"]))
+    connection = sqlite3.connect(db_path)
+    with open(tmp_path / "output" / "incidence.csv", newline='') as f:
+        incidence = [(int(row["director"]), int(row["firm"]), int(row["entries"])) for row in csv.DictReader(f)]
+    assert connection.execute("SELECT * FROM memberships ORDER BY director, firm").fetchall() == incidence
+    assert connection.execute("SELECT director, firm, COUNT(*) FROM entries GROUP BY director, firm "
+                              "ORDER BY director, firm").fetchall() == incidence
+    assert connection.execute("SELECT COUNT(*) FROM directors").fetchone()[0] == result["directors"]
+    with open(tmp_path / "output" / "firms_id_edge_list.csv", newline='') as f:
+        edges = [(int(row["src"]), int(row["dst"]), int(row["weight"])) for row in csv.DictReader(f)]
+    assert connection.execute("SELECT * FROM firm_edges ORDER BY src, dst").fetchall() == sorted(edges)
+    # Each merge of the log is stored, and those that succeeded moved the entries of the other record
+    counts = dict(connection.execute("SELECT name, count FROM lists").fetchall())
+    merges = connection.execute("SELECT m.other, m.other_entries, m.entries, m.entries_after, r.director "
+                                "FROM merges m JOIN lists l ON l.id = m.list JOIN records r ON r.id = m.record "
+                                "WHERE l.name = 'merged directors'").fetchall()
+    assert len(merges) == counts["merged directors"] > 0
+    for other, other_entries, entries, entries_after, director in merges:
+        assert entries_after == entries + other_entries
+        merged_entries = connection.execute("SELECT entry FROM record_entries WHERE record = ?", (other,)).fetchall()
+        assert connection.execute("SELECT COUNT(*) FROM entries WHERE director = ? AND id IN ({})".format(
+            ", ".join(str(entry) for entry, in merged_entries)), (director,)).fetchone()[0] == len(merged_entries)
+    connection.close()
+
+
+def test_analyze_matches_projection(tmp_path):
+    pytest.importorskip("scipy")
+    indir = tmp_path / "input"
+    indir.mkdir()
+    write_random_input_csv(indir / "input.csv", 300)
+    main(parse_args(["input.csv", "output", "--indir", str(indir), "--outdir", str(tmp_path), "--yes",
+                     "--log-level", "none", "--save-state"]))
+    directors, firms = load_run(str(tmp_path / "output") + "/")
+    results = analyze_run(directors, firms, top=3)
+    for name, objects in [("firms", firms), ("directors", directors)]:
+        edges = list(Graph(objects).get_edges())
+        degrees = [0] * len(objects)
+        for i, j, _ in edges:
+            degrees[i] += 1
+            degrees[j] += 1
+        stats = results[name]
+        assert stats["edges"] == len(edges)
+        assert stats["edge_list_lines"] == sum(value for _, _, value in edges)
+        assert stats["degree_distribution"] == sorted(collections.Counter(degrees).items())
+        assert [node["degree"] for node in stats["top"]] == sorted(degrees, reverse=True)[:3]
+        assert stats["nodes"] == sum(size * count for size, count in stats["component_size_distribution"])
+
+
+def test_link_directors_across_years():
+    table = EntryTable()
+
+    def make_directors(names):
+        directors = []
+        for first, middle in names:
+            full_name = " ".join(x for x in [first, middle, "Smith"] if x != "0")
+            entry = table.append("F0", "", full_name, first, middle, "Smith", "0", "")
+            directors.append(Director(*entry.get_director_constructor()))
+        return directors
+
+    directors_1920 = make_directors([("John", "Adam"), ("John", "0"), ("James", "0"), ("J", "0")])
+    directors_1940 = make_directors([("John", "A"), ("James", "0"), ("J", "0")])
+    # James and J match exactly, John Adam is the only match of John A, and John only matches J, which is taken
+    assert link_directors(directors_1920, directors_1940) == ([(0, 0), (2, 1), (3, 2)], 1)
+    panel_ids, link_counts = get_panel_ids([directors_1920, directors_1940])
+    assert panel_ids == [[0, 1, 2, 3], [0, 2, 3]]
+    assert link_counts == [(3, 0)]